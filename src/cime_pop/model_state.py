@@ -20,7 +20,16 @@ from ..model_config import ModelConfig, get_modelinfo, get_precond_matrix_def
 from ..model_state_base import ModelStateBase
 from ..share import args_replace, common_args, logging_config, read_cfg_file
 from ..solver_state import action_step_log_wrap
-from ..utils import ann_files_to_mean_file, class_name, mon_files_to_mean_file
+from ..tracer_module_state_base import read_cache_discard
+from ..utils import (
+    ann_files_to_mean_file,
+    class_name,
+    mon_files_to_mean_file,
+    set_netcdf_opts,
+)
+
+# format of netCDF files read by POP and the jacobian preconditioner tools
+MODEL_NETCDF_FORMAT = "NETCDF3_64BIT_OFFSET"
 
 
 def parse_args(args_list_in=None):
@@ -52,6 +61,7 @@ def main(args):
     solverinfo = config["solverinfo"]
 
     logging_config(args, solverinfo, filemode="a")
+    set_netcdf_opts(solverinfo)
     logger = logging.getLogger(__name__)
 
     logger.info('args.cmd="%s"', args.cmd)
@@ -90,7 +100,10 @@ class ModelState(ModelStateBase):
         logger.debug('hist_fname="%s", precond_fname="%s"', hist_fname, precond_fname)
 
         super().gen_precond_jacobian(
-            hist_fname, precond_fname=precond_fname, solver_state=solver_state
+            hist_fname,
+            precond_fname=precond_fname,
+            solver_state=solver_state,
+            file_format=MODEL_NETCDF_FORMAT,
         )
 
         self._gen_precond_matrix_files(precond_fname)
@@ -147,7 +160,7 @@ class ModelState(ModelStateBase):
         fcn_complete_step = "comp_fcn complete for %s" % res_fname
         if solver_state.step_logged(fcn_complete_step):
             logger.debug('"%s" logged, returning result', fcn_complete_step)
-            return ModelState(res_fname)
+            return ModelState(res_fname, lazy_vals=True)
         logger.debug('"%s" not logged, proceeding', fcn_complete_step)
 
         self._comp_fcn_pre_modelrun(res_fname=res_fname, solver_state=solver_state)
@@ -175,7 +188,7 @@ class ModelState(ModelStateBase):
         tracer_ic_fname_rel = "tracer_ic.nc"
         fname = os.path.join(cime_xmlquery("RUNDIR"), tracer_ic_fname_rel)
         caller = __name__ + "._comp_fcn_pre_modelrun"
-        self.dump(fname, caller)
+        self.dump(fname, caller, file_format=MODEL_NETCDF_FORMAT)
 
         # ensure certain env xml vars are set properly
         cime_xmlchange("POP_PASSIVE_TRACER_RESTART_OVERRIDE", tracer_ic_fname_rel)
@@ -211,13 +224,16 @@ class ModelState(ModelStateBase):
         fcn_complete_step = "apply_precond_jacobian complete for %s" % res_fname
         if solver_state.step_logged(fcn_complete_step):
             logger.debug('"%s" logged, returning result', fcn_complete_step)
-            return ModelState(res_fname)
+            return ModelState(res_fname, lazy_vals=True)
         logger.debug('"%s" not logged, proceeding', fcn_complete_step)
 
         self._apply_precond_jacobian_pre_solve_lin_eqns(res_fname, solver_state)
 
+        # lin_eqns_soln_fname is read by the preconditioner tools, so it is a netCDF
+        # file, even if res_fname is a scratch file
         lin_eqns_soln_fname = os.path.join(
-            os.path.dirname(res_fname), "lin_eqns_soln_" + os.path.basename(res_fname)
+            os.path.dirname(res_fname),
+            "lin_eqns_soln_" + os.path.splitext(os.path.basename(res_fname))[0] + ".nc",
         )
         ms_res = self._apply_precond_jacobian_solve_lin_eqns(
             precond_fname, lin_eqns_soln_fname, solver_state
@@ -321,11 +337,11 @@ class ModelState(ModelStateBase):
         )
         if solver_state.step_logged(fcn_complete_step):
             logger.debug('"%s" logged, returning result', fcn_complete_step)
-            return ModelState(res_fname)
+            return ModelState(res_fname, lazy_vals=True)
         logger.debug('"%s" not logged, proceeding', fcn_complete_step)
 
         caller = __name__ + "._apply_precond_jacobian_solve_lin_eqns"
-        self.dump(res_fname, caller)
+        self.dump(res_fname, caller, file_format=MODEL_NETCDF_FORMAT)
 
         jacobian_precond_tools_dir = get_modelinfo("jacobian_precond_tools_dir")
 
@@ -361,6 +377,8 @@ class ModelState(ModelStateBase):
             )
             logger.info('cmd="%s"', " ".join(cmd))
             subprocess.run(cmd, check=True)
+            # solve_ABdist rewrites res_fname in place
+            read_cache_discard(res_fname)
 
             _apply_tracers_sflux_term(
                 tracer_names_subset, tracer_names_all, precond_fname, res_fname
@@ -515,7 +533,8 @@ def _apply_tracers_sflux_term(
                     # replace _FillValue vals with 0.0
                     partial_deriv_vals = partial_deriv[:].filled(0.0)
                     src = model_state.get_tracer_vals(tracer_name_src)
-                    dst = model_state.get_tracer_vals(tracer_name_dst)
+                    # copy, values returned by get_tracer_vals can be read-only
+                    dst = model_state.get_tracer_vals(tracer_name_dst).copy()
                     dst[0, :] -= (
                         delta_time
                         / fptr.variables["dz"][0].data
@@ -526,7 +545,7 @@ def _apply_tracers_sflux_term(
                     term_applied = True
     if term_applied:
         caller = __name__ + "._apply_tracers_sflux_term"
-        model_state.dump(res_fname, caller)
+        model_state.dump(res_fname, caller, file_format=MODEL_NETCDF_FORMAT)
 
 
 def _pop_nl_var_exists(varname):
@@ -29,7 +29,9 @@ from ..utils import (
     extract_dimensions,
     mkdir_exist_okay,
     mon_files_to_mean_file,
+    set_netcdf_opts,
 )
+from .model_state import MODEL_NETCDF_FORMAT
 
 
 def parse_args(args_list_in=None):
@@ -56,6 +58,7 @@ def main(args):
     solverinfo = config["solverinfo"]
 
     logging_config(args, solverinfo, filemode="w")
+    set_netcdf_opts(solverinfo)
     logger = logging.getLogger(__name__)
 
     logger.info('args.cfg_fname="%s"', repro_fname(solverinfo, args.cfg_fname))
@@ -194,7 +197,7 @@ def gen_grid_weight_file(modelinfo):
             weight[k, :, :] = thickness[k] * np.where((k < kmt) & surf_mask, area, 0.0)
 
     with Dataset(
-        modelinfo["grid_weight_fname"], mode="w", format="NETCDF3_64BIT_OFFSET"
+        modelinfo["grid_weight_fname"], mode="w", format=MODEL_NETCDF_FORMAT
     ) as fptr_out:
         datestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         name = "src.cime_pop.setup_solver.gen_grid_weight_file"
@@ -238,7 +241,7 @@ def gen_region_mask_file(modelinfo):
     )
 
     with Dataset(
-        modelinfo["region_mask_fname"], mode=mode_out, format="NETCDF3_64BIT_OFFSET"
+        modelinfo["region_mask_fname"], mode=mode_out, format=MODEL_NETCDF_FORMAT
     ) as fptr_out:
         datestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         name = "src.cime_pop.setup_solver.gen_region_mask_file"
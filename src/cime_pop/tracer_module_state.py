@@ -11,7 +11,8 @@ from ..utils import (
     create_dimensions_verify,
     create_vars,
     datatype_sname,
-    extract_dimensions,
+    read_vars_stacked,
+    region_sum,
 )
 
 
@@ -27,33 +28,17 @@ class TracerModuleState(TracerModuleStateBase):
         logger.debug('tracer_module_name="%s", fname="%s"', tracer_module_name, fname)
         suffix = "_CUR"
         with Dataset(fname, mode="r") as fptr:
-            fptr.set_auto_mask(False)
-            # get dimensions from first variable
-            varname = self.tracer_names()[0] + suffix
-            dimensions = extract_dimensions(fptr, varname)
             # all tracers are stored in a single array
             # tracer index is the leading index
-            vals = np.empty((self.tracer_cnt,) + tuple(dimensions.values()))
-            # check that all vars have the same dimensions
-            for tracer_name in self.tracer_names():
-                if extract_dimensions(fptr, tracer_name + suffix) != dimensions:
-                    msg = (
-                        "not all vars have same dimensions"
-                        ", tracer_module_name=%s, fname=%s"
-                        % (tracer_module_name, fname)
-                    )
-                    raise ValueError(msg)
-            # read values
-            if len(dimensions) > 3:
-                msg = (
-                    "ndim too large (for implementation of dot_prod)"
-                    "tracer_module_name=%s, fname=%s, ndim=%s"
-                    % (tracer_module_name, fname, len(dimensions))
-                )
-                raise ValueError(msg)
-            for tracer_ind, tracer_name in enumerate(self.tracer_names()):
-                var = fptr.variables[tracer_name + suffix]
-                vals[tracer_ind, :] = var[:]
+            varnames = [tracer_name + suffix for tracer_name in self.tracer_names()]
+            vals, dimensions = read_vars_stacked(fptr, varnames)
+        if len(dimensions) > 3:
+            msg = (
+                "ndim too large (for implementation of dot_prod)"
+                "tracer_module_name=%s, fname=%s, ndim=%s"
+                % (tracer_module_name, fname, len(dimensions))
+            )
+            raise ValueError(msg)
         return vals, dimensions
 
     def dump(self, fptr, action):
@@ -138,30 +123,32 @@ class TracerModuleState(TracerModuleStateBase):
 
         # return values for tracer-like variables
 
-        grid_weight = model_config.model_config_obj.grid_weight
-
-        denom_nlon = grid_weight.sum(axis=-1)
-        numer_nlon = np.empty(denom_nlon.shape)
+        model_config_obj = model_config.model_config_obj
+        grid_weight = model_config_obj.grid_weight
+        region_ids = model_config_obj.region_ids
+        region_cnt = model_config_obj.region_cnt
 
-        denom_nlat_nlon = grid_weight.sum(axis=(-2, -1))
-        numer_nlat_nlon = np.empty(denom_nlat_nlon.shape)
+        denom_nlon = region_sum(grid_weight, region_ids, region_cnt, sum_ndim=1)
+        denom_nlat_nlon = region_sum(grid_weight, region_ids, region_cnt, sum_ndim=2)
 
         res = {}
         for tracer_name in self.stats_vars_tracer_like():
             tracer = fptr_hist.variables[tracer_name]
             fill_value = tracer._FillValue  # pylint: disable=protected-access
-            tracer_vals = tracer[:]
+            weighted_vals = grid_weight * tracer[:]
 
             # grid-i average
             varname_stats = "_".join([tracer_name, "mean", "nlon"])
-            numer_nlon[:] = (grid_weight * tracer_vals).sum(axis=-1)
+            numer_nlon = region_sum(weighted_vals, region_ids, region_cnt, sum_ndim=1)
             vals_nlon = np.full(numer_nlon.shape, fill_value)
             np.divide(numer_nlon, denom_nlon, out=vals_nlon, where=(denom_nlon != 0.0))
             res[varname_stats] = vals_nlon
 
             # grid-ij average
             varname_stats = "_".join([tracer_name, "mean", "nlat", "nlon"])
-            numer_nlat_nlon[:] = (grid_weight * tracer_vals).sum(axis=(-2, -1))
+            numer_nlat_nlon = region_sum(
+                weighted_vals, region_ids, region_cnt, sum_ndim=2
+            )
             vals_nlat_nlon = np.full(numer_nlat_nlon.shape, fill_value)
             np.divide(
                 numer_nlat_nlon,
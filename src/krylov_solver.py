@@ -8,9 +8,13 @@ import numpy as np
 from .model_config import get_region_cnt
 from .model_state_base import lin_comb
 from .region_scalars import to_ndarray, to_region_scalar_ndarray
+from .scratch_file import SCRATCH_SUFFIX
 from .solver_state import SolverState, action_step_log_wrap
 from .utils import class_name, mkdir_exist_okay
 
+# quantities whose files are only read by the solver
+_SCRATCH_QUANTITIES = ["basis", "w_raw", "w", "precond_fcn", "krylov_res"]
+
 
 class KrylovSolver:
     """
@@ -27,8 +31,13 @@ class KrylovSolver:
     Assumes x0 = 0.
     """
 
-    def __init__(self, iterate, workdir, resume, rewind, hist_fname):
-        """initialize Krylov solver"""
+    def __init__(  # pylint: disable=too-many-arguments
+        self, iterate, workdir, resume, rewind, hist_fname, use_scratch=False
+    ):
+        """
+        initialize Krylov solver
+        if use_scratch is True, solver-internal files are written in the scratch format
+        """
         logger = logging.getLogger(__name__)
         logger.debug(
             'KrylovSolver, workdir="%s", resume="%r", rewind="%r", hist_fname="%s"',
@@ -42,6 +51,7 @@ class KrylovSolver:
         mkdir_exist_okay(workdir)
 
         self._workdir = workdir
+        self._use_scratch = use_scratch
         self._solver_state = SolverState("Krylov", workdir, resume, rewind)
 
         iterate.gen_precond_jacobian(
@@ -54,7 +64,11 @@ class KrylovSolver:
         """construct fname corresponding to particular quantity"""
         if iteration is None:
             iteration = self._solver_state.get_iteration()
-        return os.path.join(self._workdir, "%s_%02d.nc" % (quantity, iteration))
+        if self._use_scratch and quantity in _SCRATCH_QUANTITIES:
+            suffix = SCRATCH_SUFFIX
+        else:
+            suffix = ".nc"
+        return os.path.join(self._workdir, "%s_%02d%s" % (quantity, iteration, suffix))
 
     def converged(self):
         """is solver converged"""
@@ -87,20 +101,14 @@ class KrylovSolver:
 
         while True:
             j_val = self._solver_state.get_iteration()
-            h_mat = to_region_scalar_ndarray(
-                np.zeros(
-                    (
-                        len(iterate.tracer_modules),
-                        j_val + 2,
-                        j_val + 1,
-                        get_region_cnt(),
-                    )
-                )
+            h_mat_ndarray = np.zeros(
+                (len(iterate.tracer_modules), j_val + 2, j_val + 1, get_region_cnt())
             )
             if j_val > 0:
-                h_mat[:, :-1, :-1] = to_region_scalar_ndarray(
-                    self._solver_state.get_value_saved_state("h_mat_ndarray")
-                )
+                h_mat_prev = self._solver_state.get_value_saved_state("h_mat_ndarray")
+                h_mat_ndarray[:, :-1, :-1] = h_mat_prev
+            # h_mat is a view of h_mat_ndarray
+            h_mat = to_region_scalar_ndarray(h_mat_ndarray)
             basis_j = type(iterate)(self._fname("basis"))
             w_raw = iterate.comp_jacobian_fcn_state_prod(
                 fcn, basis_j, self._fname("w_raw"), self._solver_state
@@ -111,7 +119,6 @@ class KrylovSolver:
             h_mat[:, :-1, -1] = w_j.mod_gram_schmidt(j_val + 1, self._fname, "basis")
             h_mat[:, -1, -1] = w_j.norm()
             w_j /= h_mat[:, -1, -1]
-            h_mat_ndarray = to_ndarray(h_mat)
             self._solver_state.set_value_saved_state("h_mat_ndarray", h_mat_ndarray)
 
             # solve least-squares minimization problem for each tracer module
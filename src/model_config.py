@@ -8,7 +8,7 @@ import yaml
 from netCDF4 import Dataset
 
 from .share import repro_fname
-from .utils import fmt_vals
+from .utils import fmt_vals, region_sum
 
 # model configuration info
 model_config_obj = None
@@ -59,6 +59,14 @@ class ModelConfig:
             modelinfo["tracer_module_names"]
         )
 
+        # number of threads used in mean and dot_prod reductions
+        self.reduction_thread_cnt = modelinfo.getint("reduction_thread_cnt", fallback=1)
+
+        # memory cap of cache of tracer values read from files
+        self.read_cache_bytes = 2 ** 20 * modelinfo.getint(
+            "read_cache_mb", fallback=1024
+        )
+
         # extract grid_weight from modelinfo config object
         fname = modelinfo["grid_weight_fname"]
         varname = modelinfo["grid_weight_varname"]
@@ -101,18 +109,36 @@ class ModelConfig:
 
         self.region_cnt = self.region_mask.max()
 
-        # add region dimension to grid_weight and normalize
-        self.grid_weight = np.empty(
-            (self.region_cnt,) + grid_weight_no_region_dim.shape
+        # region of each grid point, 0 where the point is not in any region
+        self.region_ids = np.where(self.region_mask > 0, self.region_mask, 0).astype(
+            np.intp
         )
-        for region_ind in range(self.region_cnt):
-            self.grid_weight[region_ind, :] = np.where(
-                self.region_mask == region_ind + 1, grid_weight_no_region_dim, 0.0
-            )
-            # normalize grid_weight so that its sum is 1.0 over each region
-            self.grid_weight[region_ind, :] *= 1.0 / np.sum(
-                self.grid_weight[region_ind, :]
-            )
+
+        # normalize grid_weight so that its sum is 1.0 over each region
+        region_weight_sums = region_sum(
+            grid_weight_no_region_dim, self.region_ids, self.region_cnt
+        )
+        self.grid_weight = np.zeros(grid_weight_no_region_dim.shape)
+        np.divide(
+            grid_weight_no_region_dim,
+            np.concatenate(([1.0], region_weight_sums))[self.region_ids],
+            out=self.grid_weight,
+            where=self.region_ids > 0,
+        )
+
+        # flattened grid point indices of each region, used to apply per-region
+        # scalars without broadcasting them to the full grid
+        region_ids_flat = self.region_ids.reshape(-1)
+        if self.region_cnt == 1 and np.all(region_ids_flat == 1):
+            self.region_point_inds = [slice(None)]
+        else:
+            self.region_point_inds = [
+                np.flatnonzero(region_ids_flat == region_ind + 1)
+                for region_ind in range(self.region_cnt)
+            ]
+
+        # flattened grid point indices where region_mask == 0
+        self.region_mask_zero_inds = np.flatnonzero(self.region_mask == 0)
 
         # store contents in module level var, to enable use elsewhere
         global model_config_obj  # pylint: disable=global-statement
@@ -3,17 +3,21 @@
 import collections
 import copy
 import logging
+import operator
 import os
 from datetime import datetime
 from inspect import signature
+from itertools import repeat
 
 import numpy as np
 from netCDF4 import Dataset
 
 from . import model_config
-from .model_config import get_modelinfo, get_precond_matrix_def
+from .model_config import get_modelinfo, get_precond_matrix_def, get_region_cnt
+from .region_scalars import RegionScalarsArray
+from .scratch_file import is_scratch_fname, write_scratch
 from .solver_state import action_step_log_wrap
-from .tracer_module_state_base import TracerModuleStateBase
+from .tracer_module_state_base import TracerModuleStateBase, read_cache_discard
 from .utils import (
     class_name,
     create_dimensions_verify,
@@ -21,6 +25,7 @@ from .utils import (
     dict_update_verify,
     extract_dimensions,
     get_subclasses,
+    netcdf_format,
 )
 
 
@@ -30,9 +35,14 @@ class ModelStateBase:
     # give ModelStateBase operators higher priority than those of numpy
     __array_priority__ = 100
 
-    def __init__(self, fname):
+    def __init__(self, fname, lazy_vals=False):
+        """
+        initialize ModelStateBase object from fname
+        if lazy_vals is True, reading of each tracer module's values is deferred until
+        they are accessed
+        """
         logger = logging.getLogger(__name__)
-        logger.debug('ModelStateBase, fname="%s"', fname)
+        logger.debug('ModelStateBase, fname="%s", lazy_vals="%r"', fname, lazy_vals)
         if model_config.model_config_obj is None:
             msg = (
                 "model_config.model_config_obj is None, %s must be called before %s"
@@ -64,11 +74,17 @@ class ModelStateBase:
             self.tracer_modules[ind] = tracer_module_state_class(
                 tracer_module_name, fname, **kwargs
             )
+            if not lazy_vals:
+                self.tracer_modules[ind].load_vals()
 
         self.tracer_cnt = sum(
             tracer_module.tracer_cnt for tracer_module in self.tracer_modules
         )
 
+        # (hist_fname, name_vals_dict) of stats vars computed when hist_fname was
+        # written, set by comp_fcn of derived classes that have the hist vals in memory
+        self._hist_stats_vars_vals = None
+
     def tracer_names(self):
         """return list of tracer names"""
         res = []
@@ -80,20 +96,34 @@ class ModelStateBase:
         """return the index of a tracer"""
         return self.tracer_names().index(tracer_name)
 
-    def dump(self, fname, caller=None):
-        """dump ModelStateBase object to a file"""
+    def dump(self, fname, caller=None, file_format=None):
+        """
+        dump ModelStateBase object to a file
+        if file_format is None, a scratch fname is written in the scratch format, and
+        other fnames are written in the format of netCDF files written by the solver
+        """
         logger = logging.getLogger(__name__)
         logger.debug('fname="%s"', fname)
         if fname is None:
             return self
-        with Dataset(fname, mode="w", format="NETCDF3_64BIT_OFFSET") as fptr:
-            datestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            name = class_name(self) + ".dump"
-            msg = datestamp + ": created by " + name
-            if caller is not None:
-                msg = msg + " called from " + caller
-            else:
-                raise ValueError("caller unknown")
+        datestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        name = class_name(self) + ".dump"
+        msg = datestamp + ": created by " + name
+        if caller is not None:
+            msg = msg + " called from " + caller
+        else:
+            raise ValueError("caller unknown")
+        if file_format is None and is_scratch_fname(fname):
+            contents = {
+                tracer_module.name: tracer_module.scratch_contents()
+                for tracer_module in self.tracer_modules
+            }
+            write_scratch(fname, msg, contents)
+            return self
+        if file_format is None:
+            file_format = netcdf_format()
+        read_cache_discard(fname)
+        with Dataset(fname, mode="w", format=file_format) as fptr:
             fptr.history = msg
             for action in ["define", "write"]:
                 for tracer_module in self.tracer_modules:
@@ -123,11 +153,12 @@ class ModelStateBase:
             msg_full = ["mean", "norm"]
         else:
             msg_full = [msg + ",mean", msg + ",norm"]
-        mean_vals = self.mean()
-        norm_vals = self.norm()
-        self.log_vals(msg_full, np.stack((mean_vals, norm_vals)))
+        mean_vals, norm_vals, _ = self.mean_norm_dot_prods()
+        self.log_vals(msg_full, np.stack((mean_vals.vals(), norm_vals.vals())))
 
-    @action_step_log_wrap(step="ModelStateBase.def_stats_vars", per_iteration=False)
+    @action_step_log_wrap(
+        step="ModelStateBase.def_stats_vars", per_iteration=False, deferred=True
+    )
     # pylint: disable=unused-argument
     def def_stats_vars(self, stats_file, hist_fname, solver_state):
         """define model specific stats variables"""
@@ -147,7 +178,9 @@ class ModelStateBase:
         stats_file.def_vars(vars_metadata)
 
     @action_step_log_wrap(
-        step="ModelStateBase.put_stats_vars_iteration_invariant", per_iteration=False
+        step="ModelStateBase.put_stats_vars_iteration_invariant",
+        per_iteration=False,
+        deferred=True,
     )
     # pylint: disable=unused-argument
     def put_stats_vars_iteration_invariant(self, stats_file, hist_fname, solver_state):
@@ -162,23 +195,74 @@ class ModelStateBase:
                 dict_update_verify(name_vals_dict, name_vals_to_add)
         stats_file.put_vars_iteration_invariant(name_vals_dict)
 
-    @action_step_log_wrap(step="ModelStateBase.put_stats_vars")
+    @action_step_log_wrap(step="ModelStateBase.put_stats_vars", deferred=True)
     def put_stats_vars(self, stats_file, hist_fname, solver_state):
         """put values of stats variables for the current iteration"""
+        stats_file.put_vars(
+            solver_state.get_iteration(), self._stats_vars_vals(hist_fname)
+        )
+
+    def _stats_vars_vals(self, hist_fname):
+        """
+        return dict of values of stats variables for the current iteration
+        values computed when hist_fname was written are used if they are available,
+        otherwise they are computed from the contents of hist_fname
+        """
+        if (
+            self._hist_stats_vars_vals is not None
+            and self._hist_stats_vars_vals[0] == hist_fname
+        ):
+            return self._hist_stats_vars_vals[1]
         name_vals_dict = {}
         with Dataset(hist_fname, mode="r") as fptr_hist:
             fptr_hist.set_auto_mask(False)
             for tracer_module in self.tracer_modules:
                 name_vals_to_add = tracer_module.stats_vars_vals(fptr_hist)
                 dict_update_verify(name_vals_dict, name_vals_to_add)
-        stats_file.put_vars(solver_state.get_iteration(), name_vals_dict)
+        return name_vals_dict
+
+    def __copy__(self):
+        """
+        shallow copy operator
+        tracer modules are copied, so that inplace operators applied to the copy do
+        not modify self, and vice versa
+        """
+        res = self._copy_without_tracer_modules()
+        res.tracer_modules = np.empty(len(self.tracer_modules), dtype=np.object)
+        for ind, tracer_module in enumerate(self.tracer_modules):
+            res.tracer_modules[ind] = copy.copy(tracer_module)
+        return res
+
+    def __deepcopy__(self, memo):
+        """
+        deep copy operator
+        retained stats vars are not copied, because they are only valid for self
+        """
+        res = type(self).__new__(type(self))
+        memo[id(self)] = res
+        for key, value in self.__dict__.items():
+            if key != "_hist_stats_vars_vals":
+                setattr(res, key, copy.deepcopy(value, memo))
+        res._hist_stats_vars_vals = None
+        return res
+
+    def _copy_without_tracer_modules(self):
+        """
+        return shallow copy of self that shares tracer modules with self
+        this is for operators that replace tracer_modules of the result
+        """
+        res = type(self).__new__(type(self))
+        res.__dict__.update(self.__dict__)
+        # retained stats vars are only valid for the state that wrote the hist file
+        res._hist_stats_vars_vals = None
+        return res
 
     def __neg__(self):
         """
         unary negation operator
         called to evaluate res = -self
         """
-        res = copy.copy(self)
+        res = self._copy_without_tracer_modules()
         res.tracer_modules = -self.tracer_modules
         return res
 
@@ -187,7 +271,7 @@ class ModelStateBase:
         addition operator
         called to evaluate res = self + other
         """
-        res = copy.copy(self)
+        res = self._copy_without_tracer_modules()
         if isinstance(other, ModelStateBase):
             res.tracer_modules = self.tracer_modules + other.tracer_modules
         else:
@@ -207,7 +291,7 @@ class ModelStateBase:
         called to evaluate self += other
         """
         if isinstance(other, ModelStateBase):
-            self.tracer_modules += other.tracer_modules
+            self._apply_inplace(operator.iadd, other.tracer_modules)
         else:
             return NotImplemented
         return self
@@ -217,7 +301,7 @@ class ModelStateBase:
         subtraction operator
         called to evaluate res = self - other
         """
-        res = copy.copy(self)
+        res = self._copy_without_tracer_modules()
         if isinstance(other, ModelStateBase):
             res.tracer_modules = self.tracer_modules - other.tracer_modules
         else:
@@ -230,7 +314,7 @@ class ModelStateBase:
         called to evaluate self -= other
         """
         if isinstance(other, ModelStateBase):
-            self.tracer_modules -= other.tracer_modules
+            self._apply_inplace(operator.isub, other.tracer_modules)
         else:
             return NotImplemented
         return self
@@ -240,11 +324,11 @@ class ModelStateBase:
         multiplication operator
         called to evaluate res = self * other
         """
-        res = copy.copy(self)
+        res = self._copy_without_tracer_modules()
         if isinstance(other, float):
             res.tracer_modules = self.tracer_modules * other
-        elif isinstance(other, np.ndarray):
-            res.tracer_modules = self.tracer_modules * other
+        elif isinstance(other, RegionScalarsArray):
+            res.tracer_modules = self.tracer_modules * self._per_tracer_module(other)
         elif isinstance(other, ModelStateBase):
             res.tracer_modules = self.tracer_modules * other.tracer_modules
         else:
@@ -264,11 +348,11 @@ class ModelStateBase:
         called to evaluate self *= other
         """
         if isinstance(other, float):
-            self.tracer_modules *= other
-        elif isinstance(other, np.ndarray):
-            self.tracer_modules *= other
+            self._apply_inplace(operator.imul, repeat(other))
+        elif isinstance(other, RegionScalarsArray):
+            self._apply_inplace(operator.imul, self._per_tracer_module(other))
         elif isinstance(other, ModelStateBase):
-            self.tracer_modules *= other.tracer_modules
+            self._apply_inplace(operator.imul, other.tracer_modules)
         else:
             return NotImplemented
         return self
@@ -278,11 +362,13 @@ class ModelStateBase:
         division operator
         called to evaluate res = self / other
         """
-        res = copy.copy(self)
+        res = self._copy_without_tracer_modules()
         if isinstance(other, float):
             res.tracer_modules = self.tracer_modules * (1.0 / other)
-        elif isinstance(other, np.ndarray):
-            res.tracer_modules = self.tracer_modules * (1.0 / other)
+        elif isinstance(other, RegionScalarsArray):
+            res.tracer_modules = self.tracer_modules * self._per_tracer_module(
+                other.recip()
+            )
         elif isinstance(other, ModelStateBase):
             res.tracer_modules = self.tracer_modules / other.tracer_modules
         else:
@@ -294,11 +380,11 @@ class ModelStateBase:
         reversed division operator
         called to evaluate res = other / self
         """
-        res = copy.copy(self)
+        res = self._copy_without_tracer_modules()
         if isinstance(other, float):
             res.tracer_modules = other / self.tracer_modules
-        elif isinstance(other, np.ndarray):
-            res.tracer_modules = other / self.tracer_modules
+        elif isinstance(other, RegionScalarsArray):
+            res.tracer_modules = self._per_tracer_module(other) / self.tracer_modules
         else:
             return NotImplemented
         return res
@@ -309,43 +395,95 @@ class ModelStateBase:
         called to evaluate self /= other
         """
         if isinstance(other, float):
-            self.tracer_modules *= 1.0 / other
-        elif isinstance(other, np.ndarray):
-            self.tracer_modules *= 1.0 / other
+            self._apply_inplace(operator.imul, repeat(1.0 / other))
+        elif isinstance(other, RegionScalarsArray):
+            self._apply_inplace(operator.imul, self._per_tracer_module(other.recip()))
         elif isinstance(other, ModelStateBase):
-            self.tracer_modules /= other.tracer_modules
+            self._apply_inplace(operator.itruediv, other.tracer_modules)
         else:
             return NotImplemented
         return self
 
+    def _apply_inplace(self, inplace_op, others):
+        """
+        apply inplace operator to each tracer module, with corresponding element of
+        others, modifying tracer module values in place
+        tracer module values shared with copies of self are copied before modification
+        """
+        # retained stats vars are not valid for the modified values
+        self._hist_stats_vars_vals = None
+        for tracer_module, other in zip(self.tracer_modules, others):
+            inplace_op(tracer_module, other)
+
+    def _per_tracer_module(self, region_scalars_array):
+        """
+        return ndarray of RegionScalars, one per tracer module, from
+        RegionScalarsArray whose leading dimension is per tracer module
+        """
+        res = np.empty(self.tracer_modules.shape, dtype=np.object)
+        for ind in range(len(self.tracer_modules)):
+            res[ind] = region_scalars_array[ind]
+        return res
+
+    def _region_scalars_array(self):
+        """return uninitialized vals for a RegionScalarsArray, per tracer module"""
+        return np.empty(self.tracer_modules.shape + (get_region_cnt(),))
+
     def mean(self):
         """compute weighted mean of self"""
-        res = np.empty(self.tracer_modules.shape, dtype=np.object)
+        res = self._region_scalars_array()
         for ind, tracer_module in enumerate(self.tracer_modules):
-            res[ind] = tracer_module.mean()
-        return res
+            res[ind] = tracer_module.mean().vals()
+        return RegionScalarsArray(res)
 
     def dot_prod(self, other):
         """compute weighted dot product of self with other"""
-        res = np.empty(self.tracer_modules.shape, dtype=np.object)
+        res = self._region_scalars_array()
         for ind, tracer_module in enumerate(self.tracer_modules):
-            res[ind] = tracer_module.dot_prod(other.tracer_modules[ind])
-        return res
+            res[ind] = tracer_module.dot_prod(other.tracer_modules[ind]).vals()
+        return RegionScalarsArray(res)
 
     def norm(self):
         """compute weighted l2 norm of self"""
-        return np.sqrt(self.dot_prod(self))
+        return self.dot_prod(self).sqrt()
+
+    def mean_norm_dot_prods(self, others=()):
+        """
+        compute weighted mean and weighted l2 norm of self, and weighted dot products
+        of self with each ModelStateBase object in others, in a single pass over the
+        values of each tracer module of self
+        return tuple (mean, norm, dot_prods), where dot_prods is a list
+        """
+        mean = self._region_scalars_array()
+        dot_prod_self = self._region_scalars_array()
+        dot_prods = [self._region_scalars_array() for _ in others]
+        for ind, tracer_module in enumerate(self.tracer_modules):
+            mean_ind, dot_prod_self_ind, dot_prods_ind = tracer_module.mean_dot_prods(
+                [other.tracer_modules[ind] for other in others]
+            )
+            mean[ind] = mean_ind.vals()
+            dot_prod_self[ind] = dot_prod_self_ind.vals()
+            for other_ind, dot_prod in enumerate(dot_prods_ind):
+                dot_prods[other_ind][ind] = dot_prod.vals()
+        return (
+            RegionScalarsArray(mean),
+            RegionScalarsArray(np.sqrt(dot_prod_self)),
+            [RegionScalarsArray(vals) for vals in dot_prods],
+        )
 
     def mod_gram_schmidt(self, basis_cnt, fname_fcn, quantity):
         """
         inplace modified Gram-Schmidt projection
         return projection coefficients
         """
-        h_val = np.empty((len(self.tracer_modules), basis_cnt), dtype=np.object)
+        h_val = RegionScalarsArray(
+            np.empty((len(self.tracer_modules), basis_cnt, get_region_cnt()))
+        )
         for i_val in range(0, basis_cnt):
             basis_i = type(self)(fname_fcn(quantity, i_val))
             h_val[:, i_val] = self.dot_prod(basis_i)
-            self -= h_val[:, i_val] * basis_i
+            basis_i *= h_val[:, i_val]
+            self -= basis_i
         return h_val
 
     def hist_vars_for_precond_list(self):
@@ -377,18 +515,23 @@ class ModelStateBase:
         step="ModelStateBase.gen_precond_jacobian {precond_fname}", per_iteration=False
     )
     # pylint: disable=unused-argument
-    def gen_precond_jacobian(self, hist_fname, precond_fname, solver_state):
+    def gen_precond_jacobian(
+        self, hist_fname, precond_fname, solver_state, file_format=None
+    ):
         """
         Generate file(s) needed for preconditioner of jacobian of comp_fcn
         evaluated at self
+        file_format defaults to the format of netCDF files written by the solver
         """
         logger = logging.getLogger(__name__)
         logger.debug('hist_fname="%s", precond_fname="%s"', hist_fname, precond_fname)
 
         hist_vars = self.hist_vars_for_precond_list()
 
+        if file_format is None:
+            file_format = netcdf_format()
         with Dataset(hist_fname, mode="r") as fptr_in, Dataset(
-            precond_fname, "w", format="NETCDF3_64BIT_OFFSET"
+            precond_fname, "w", format=file_format
         ) as fptr_out:
             datestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             fcn_name = class_name(self) + ".gen_precond_jacobian"
@@ -475,19 +618,18 @@ class ModelStateBase:
 
         if solver_state.step_logged(fcn_complete_step):
             logger.debug('"%s" logged, returning result', fcn_complete_step)
-            return type(self)(res_fname)
+            return type(self)(res_fname, lazy_vals=True)
         logger.debug('"%s" not logged, proceeding', fcn_complete_step)
 
         sigma = 1.0e-4 * self.norm()
 
         # set sigma to 1.0 where it is 0.0
-        for tracer_module_ind in range(len(self.tracer_modules)):
-            sigma_vals = sigma[tracer_module_ind].vals()
-            if any(sigma_vals == 0.0):
-                sigma_vals[:] = np.where(sigma_vals == 0.0, 1.0, sigma_vals)
+        sigma_vals = sigma.vals()
+        sigma_vals[sigma_vals == 0.0] = 1.0
 
         # perturbed ModelStateBase
-        perturb_ms = self + sigma * direction
+        perturb_ms = direction * sigma
+        perturb_ms += self
         perturb_fcn_fname = os.path.join(
             solver_state.get_workdir(), "perturb_fcn_" + os.path.basename(res_fname)
         )
@@ -495,7 +637,10 @@ class ModelStateBase:
 
         # compute finite difference
         caller = class_name(self) + ".comp_jacobian_fcn_state_prod"
-        res = ((perturb_fcn - fcn) / sigma).dump(res_fname, caller)
+        res = perturb_fcn
+        res -= fcn
+        res /= sigma
+        res.dump(res_fname, caller)
 
         solver_state.log_step(fcn_complete_step)
 
@@ -591,10 +736,19 @@ def _precond_dimensions_for_hist_var(fptr_hist, hist_varname, time_op):
 
 
 def lin_comb(res_type, coeff, fname_fcn, quantity):
-    """compute a linear combination of ModelStateBase objects in files"""
-    res = coeff[:, 0] * res_type(fname_fcn(quantity, 0))
+    """
+    compute a linear combination of ModelStateBase objects in files
+    Tracer modules from files after the first are read one at a time, and released
+    after being accumulated into the result, to bound memory usage.
+    """
+    res = res_type(fname_fcn(quantity, 0))
+    res *= coeff[:, 0]
     for j_val in range(1, coeff.shape[-1]):
-        res += coeff[:, j_val] * res_type(fname_fcn(quantity, j_val))
+        model_state = res_type(fname_fcn(quantity, j_val), lazy_vals=True)
+        for ind, tracer_module in enumerate(model_state.tracer_modules):
+            model_state.tracer_modules[ind] = None
+            tracer_module *= coeff[ind, j_val]
+            res.tracer_modules[ind] += tracer_module
     return res
 
 
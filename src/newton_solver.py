@@ -8,10 +8,19 @@ import numpy as np
 from .krylov_solver import KrylovSolver
 from .model_config import get_modelinfo
 from .region_scalars import to_ndarray, to_region_scalar_ndarray
+from .scratch_file import SCRATCH_SUFFIX, use_scratch
 from .solver_state import SolverState, action_step_log_wrap
 from .stats_file import StatsFile
 from .utils import class_name, dict_sel, fmt_vals, mkdir_exist_okay
 
+# prefixes of quantities whose files are only read by the solver
+_SCRATCH_QUANTITY_PREFIXES = (
+    "prov_Armijo",
+    "prov_fcn_Armijo",
+    "prov_fp",
+    "prov_fcn_fp",
+)
+
 
 class NewtonSolver:
     """
@@ -29,12 +38,13 @@ class NewtonSolver:
         mkdir_exist_okay(workdir)
 
         self._solverinfo = solverinfo
+        self._use_scratch = use_scratch(solverinfo)
         self._solver_state = SolverState("Newton", workdir, resume, rewind)
         self._stats_file = StatsFile("Newton", workdir, self._solver_state)
 
         step = "Newton iterate 0 written"
         if self._solver_state.step_logged(step, per_iteration=False):
-            self._iterate = model_state_class(self._fname("iterate"))
+            self._iterate = model_state_class(self._fname("iterate"), lazy_vals=True)
         else:
             self._iterate = model_state_class(get_modelinfo("init_iterate_fname"))
             caller = class_name(self) + ".__init__"
@@ -63,6 +73,7 @@ class NewtonSolver:
         self._iterate.put_stats_vars(
             self._stats_file, self._fname("hist"), solver_state=self._solver_state
         )
+        self._stats_file.flush()
 
     def gen_stats_vars_metadata(self):
         """generate metadata for stats vars from Newton solver"""
@@ -118,12 +129,15 @@ class NewtonSolver:
     def _def_solver_stats_vars(self, solver_state):
         """define stats vars from Newton solver"""
         self._stats_file.def_vars(self._stats_vars_metadata)
+        self._stats_file.flush()
 
     def _put_solver_stats_vars(self, **kwargs):
-        """write vals corresponding to kwargs for all tracer modules to stats file"""
+        """
+        write vals corresponding to kwargs for all tracer modules to stats file
+        vals are buffered in the stats file, until its flush method is called
+        """
 
         # dict of varname and values to be written
-        # collect together before opening file and writing
         varname_vals_all = {}
 
         for category, vals_dict in kwargs.items():
@@ -131,19 +145,21 @@ class NewtonSolver:
             if category == "model_state":
                 for state_name, model_state in vals_dict.items():
                     vars_metadata_sub = dict_sel(vars_metadata, state_name=state_name)
+                    vals_reduced_all = None
                     for method in ["mean", "norm"]:
                         step = "write %s %s vals to stats file" % (state_name, method)
                         if self._solver_state.step_logged(step):
                             continue
-                        if method == "mean":
-                            vals_reduced = model_state.mean()
-                        else:
-                            vals_reduced = model_state.norm()
+                        # compute mean and norm together, in a single pass
+                        if vals_reduced_all is None:
+                            mean_vals, norm_vals, _ = model_state.mean_norm_dot_prods()
+                            vals_reduced_all = {"mean": mean_vals, "norm": norm_vals}
+                        vals_reduced = vals_reduced_all[method]
                         varname_vals_scalar = self._gen_varname_vals_scalar(
                             vars_metadata_sub, vals_reduced, method=method
                         )
                         varname_vals_all.update(varname_vals_scalar)
-                        self._solver_state.log_step(step)
+                        self._solver_state.defer_log_step(step)
             elif category == "scalar":
                 for scalar_name, scalar_val in vals_dict.items():
                     varname_vals_scalar = self._gen_varname_vals_scalar(
@@ -171,8 +187,12 @@ class NewtonSolver:
         """construct fname corresponding to particular quantity"""
         if iteration is None:
             iteration = self._solver_state.get_iteration()
+        if self._use_scratch and quantity.startswith(_SCRATCH_QUANTITY_PREFIXES):
+            suffix = SCRATCH_SUFFIX
+        else:
+            suffix = ".nc"
         return os.path.join(
-            self._solverinfo["workdir"], "%s_%02d.nc" % (quantity, iteration)
+            self._solverinfo["workdir"], "%s_%02d%s" % (quantity, iteration, suffix)
         )
 
     def log(self, iterate=None, fcn=None, msg=None):
@@ -206,7 +226,7 @@ class NewtonSolver:
 
         if self._solver_state.step_logged(fcn_complete_step):
             logger.debug('"%s" logged, returning result', fcn_complete_step)
-            return type(self._iterate)(self._fname("increment"))
+            return type(self._iterate)(self._fname("increment"), lazy_vals=True)
         logger.debug('"%s" not logged, computing increment', fcn_complete_step)
 
         krylov_dir = os.path.join(
@@ -219,13 +239,19 @@ class NewtonSolver:
         if not resume:
             self.log()
         krylov_solver = KrylovSolver(
-            self._iterate, krylov_dir, resume, rewind, self._fname("hist")
+            self._iterate,
+            krylov_dir,
+            resume,
+            rewind,
+            self._fname("hist"),
+            self._use_scratch,
         )
         self._solver_state.log_step(step)
         increment = krylov_solver.solve(
             self._fname("increment"), self._iterate, self._fcn
         )
         self._put_solver_stats_vars(model_state={"increment": increment})
+        self._stats_file.flush()
         self._solver_state.log_step(fcn_complete_step)
         iteration = self._solver_state.get_iteration()
         increment.log("Newton increment %02d" % iteration)
@@ -254,9 +280,14 @@ class NewtonSolver:
 
         if self._solver_state.step_logged(fcn_complete_step):
             logger.debug('"%s" logged, returning result', fcn_complete_step)
+            model_state_class = type(self._iterate)
             return (
-                type(self._iterate)(self._fname("prov_Armijo_%02d" % armijo_ind)),
-                type(self._iterate)(self._fname("prov_fcn_Armijo_%02d" % armijo_ind)),
+                model_state_class(
+                    self._fname("prov_Armijo_%02d" % armijo_ind), lazy_vals=True
+                ),
+                model_state_class(
+                    self._fname("prov_fcn_Armijo_%02d" % armijo_ind), lazy_vals=True
+                ),
             )
         logger.debug('"%s" not logged, proceeding', fcn_complete_step)
 
@@ -285,7 +316,7 @@ class NewtonSolver:
             prov_fcn_norm = prov_fcn.norm()
             increment.log_vals(
                 ["ArmijoFactor", "fcn_norm", "prov_fcn_norm"],
-                np.stack((armijo_factor, fcn_norm, prov_fcn_norm)),
+                np.stack((armijo_factor.vals(), fcn_norm.vals(), prov_fcn_norm.vals())),
             )
             alpha = 1.0e-4
             armijo_cond_flat = (armijo_factor_flat == 0.0) | (
@@ -298,6 +329,7 @@ class NewtonSolver:
                 self._solver_state.log_step(fcn_complete_step)
 
                 self._put_solver_stats_vars(scalar={"Armijo_factor": armijo_factor})
+                self._stats_file.flush()
 
                 return prov, prov_fcn
 
@@ -363,8 +395,13 @@ class NewtonSolver:
             self._solver_state.log_step(step)
         else:
             fp_iter = self._solver_state.get_value_saved_state(key="fp_iter")
-            prov = type(self._iterate)(self._fname("prov_fp_%02d" % fp_iter))
-            prov_fcn = type(self._iterate)(self._fname("prov_fcn_fp_%02d" % fp_iter))
+            model_state_class = type(self._iterate)
+            prov = model_state_class(
+                self._fname("prov_fp_%02d" % fp_iter), lazy_vals=True
+            )
+            prov_fcn = model_state_class(
+                self._fname("prov_fcn_fp_%02d" % fp_iter), lazy_vals=True
+            )
 
         while fp_iter < self._solverinfo.getint("post_newton_fp_iter"):
             step = "prov updated for fp iteration %02d" % fp_iter
@@ -376,7 +413,9 @@ class NewtonSolver:
                 prov.dump(self._fname("prov_fp_%02d" % (fp_iter + 1)), caller)
                 self._solver_state.log_step(step)
             else:
-                prov = type(self._iterate)(self._fname("prov_fp_%02d" % (fp_iter + 1)))
+                prov = type(self._iterate)(
+                    self._fname("prov_fp_%02d" % (fp_iter + 1)), lazy_vals=True
+                )
             if fp_iter + 1 < self._solverinfo.getint("post_newton_fp_iter"):
                 res_fname = self._fname("prov_fcn_fp_%02d" % (fp_iter + 1))
                 hist_fname = self._fname("prov_hist_fp_%02d" % (fp_iter + 1))
@@ -401,3 +440,4 @@ class NewtonSolver:
             hist_fname=self._fname("hist"),
             solver_state=self._solver_state,
         )
+        self._stats_file.flush()
@@ -9,7 +9,7 @@ from .model_config import ModelConfig, get_modelinfo
 from .model_state_base import ModelStateBase
 from .newton_solver import NewtonSolver
 from .share import args_replace, common_args, logging_config, read_cfg_file
-from .utils import get_subclasses
+from .utils import get_subclasses, set_netcdf_opts
 
 
 def parse_args(args_list_in=None):
@@ -43,6 +43,7 @@ def main(args):
     solverinfo = config["solverinfo"]
 
     logging_config(args, solverinfo, filemode="a")
+    set_netcdf_opts(solverinfo)
     logger = logging.getLogger(__name__)
 
     if os.path.exists("KILL"):
@@ -2,6 +2,7 @@
 
 import numpy as np
 
+from . import model_config
 from .model_config import get_region_cnt
 
 
@@ -72,6 +73,22 @@ class RegionScalars:
         """return RegionScalars object with sqrt applied to vals in self"""
         return RegionScalars(np.sqrt(self._vals))
 
+    def scale_grid_vals(self, vals):
+        """
+        multiply vals in place by vals from self, and return vals
+        vals is a contiguous array whose trailing dimensions are the model grid
+        values in vals are:
+            unchanged           where region_mask is <= 0
+            multiplied by _vals[ind]    where region_mask == ind+1
+        """
+        region_point_inds = model_config.model_config_obj.region_point_inds
+        # reshape via a view, so that an error is raised instead of silently copying
+        vals_flat = vals.view()
+        vals_flat.shape = (-1, model_config.model_config_obj.region_ids.size)
+        for region_ind, point_inds in enumerate(region_point_inds):
+            vals_flat[:, point_inds] *= self._vals[region_ind]
+        return vals
+
     def broadcast(self, region_mask, fill_value=1.0):
         """
         broadcast vals from self to an array of same shape as region_mask
@@ -86,69 +103,147 @@ class RegionScalars:
         return res
 
 
+class RegionScalarsArray:
+    """
+    class to hold an array of per-region scalars
+    values are stored in an ndarray, whose last dimension is the region dimension
+    """
+
+    def __init__(self, vals):
+        self._vals = np.asarray(vals, dtype=np.float64)
+        if self._vals.ndim == 0 or self._vals.shape[-1] != get_region_cnt():
+            msg = "last dimension must have length get_region_cnt()"
+            raise ValueError(msg)
+
+    @property
+    def shape(self):
+        """shape of array, excluding the region dimension"""
+        return self._vals.shape[:-1]
+
+    @property
+    def ndim(self):
+        """number of dimensions of array, excluding the region dimension"""
+        return self._vals.ndim - 1
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        """
+        index array, excluding the region dimension
+        return RegionScalars if all dimensions are indexed by integers,
+        RegionScalarsArray otherwise
+        """
+        vals = self._vals[key]
+        if vals.ndim == 1:
+            return RegionScalars(vals)
+        return RegionScalarsArray(vals)
+
+    def __setitem__(self, key, value):
+        """set values, where value is RegionScalars or RegionScalarsArray"""
+        if isinstance(value, (RegionScalars, RegionScalarsArray)):
+            self._vals[key] = value.vals()
+        else:
+            msg = "value must be RegionScalars or RegionScalarsArray"
+            raise TypeError(msg)
+
+    def __eq__(self, other):
+        """
+        equality operator
+        called to evaluate res == other
+        """
+        if isinstance(other, RegionScalarsArray):
+            return np.array_equal(other._vals, self._vals)
+        return NotImplemented
+
+    def __neg__(self):
+        """
+        unary negation operator
+        called to evaluate res = -self
+        """
+        return RegionScalarsArray(-self._vals)
+
+    def __mul__(self, other):
+        """
+        multiplication operator
+        called to evaluate res = self * other
+        """
+        if isinstance(other, float):
+            return RegionScalarsArray(self._vals * other)
+        if isinstance(other, RegionScalarsArray):
+            return RegionScalarsArray(self._vals * other._vals)
+        return NotImplemented
+
+    def __rmul__(self, other):
+        """
+        reversed multiplication operator
+        called to evaluate res = other * self
+        """
+        return self * other
+
+    def __truediv__(self, other):
+        """
+        division operator
+        called to evaluate res = self / other
+        """
+        if isinstance(other, float):
+            return RegionScalarsArray(self._vals / other)
+        if isinstance(other, RegionScalarsArray):
+            return RegionScalarsArray(self._vals / other._vals)
+        return NotImplemented
+
+    def __rtruediv__(self, other):
+        """
+        reversed division operator
+        called to evaluate res = other / self
+        """
+        if isinstance(other, float):
+            return RegionScalarsArray(other / self._vals)
+        return NotImplemented
+
+    def vals(self):
+        """return vals from object, including trailing region dimension"""
+        return self._vals
+
+    def recip(self):
+        """
+        return RegionScalarsArray object with reciprocal operator applied to vals in
+        self
+        """
+        return RegionScalarsArray(1.0 / self._vals)
+
+    def sqrt(self):
+        """return RegionScalarsArray object with sqrt applied to vals in self"""
+        return RegionScalarsArray(np.sqrt(self._vals))
+
+
 def to_ndarray(array_in):
     """
-    Create an ndarray, res, from an ndarray of RegionScalars.
+    Create an ndarray, res, from RegionScalars, RegionScalarsArray, or an ndarray of
+    RegionScalars.
     res.ndim is 1 greater than array_in.ndim.
     The implicit RegionScalars dimension is placed last in res.
+    For RegionScalarsArray, res is a view of the values in array_in.
     """
 
+    if isinstance(array_in, RegionScalarsArray):
+        return array_in.vals()
+
     if isinstance(array_in, RegionScalars):
         return np.array(array_in.vals())
 
     res = np.empty(array_in.shape + (get_region_cnt(),))
-
-    if array_in.ndim == 0:
-        res[:] = array_in[()].vals()
-    elif array_in.ndim == 1:
-        for ind0 in range(array_in.shape[0]):
-            res[ind0, :] = array_in[ind0].vals()
-    elif array_in.ndim == 2:
-        for ind0 in range(array_in.shape[0]):
-            for ind1 in range(array_in.shape[1]):
-                res[ind0, ind1, :] = array_in[ind0, ind1].vals()
-    elif array_in.ndim == 3:
-        for ind0 in range(array_in.shape[0]):
-            for ind1 in range(array_in.shape[1]):
-                for ind2 in range(array_in.shape[2]):
-                    res[ind0, ind1, ind2, :] = array_in[ind0, ind1, ind2].vals()
-    else:
-        msg = "array_in.ndim=%d not handled" % array_in.ndim
-        raise ValueError(msg)
-
+    for ind, region_scalars in np.ndenumerate(array_in):
+        res[ind] = region_scalars.vals()
     return res
 
 
 def to_region_scalar_ndarray(array_in):
     """
-    Create an ndarray of RegionScalars, res, from an ndarray.
+    Create a RegionScalarsArray, res, from an ndarray.
     res.ndim is 1 less than array_in.ndim.
     The last dimension of array_in corresponds to to implicit RegionScalars dimension in
     res.
+    res shares values with array_in, if array_in has dtype float64.
     """
-
-    if array_in.shape[-1] != get_region_cnt():
-        msg = "last dimension must have length get_region_cnt()"
-        raise ValueError(msg)
-
-    res = np.empty(array_in.shape[:-1], dtype=np.object)
-
-    if array_in.ndim == 1:
-        res[()] = RegionScalars(array_in[:])
-    elif array_in.ndim == 2:
-        for ind0 in range(array_in.shape[0]):
-            res[ind0] = RegionScalars(array_in[ind0, :])
-    elif array_in.ndim == 3:
-        for ind0 in range(array_in.shape[0]):
-            for ind1 in range(array_in.shape[1]):
-                res[ind0, ind1] = RegionScalars(array_in[ind0, ind1, :])
-    elif array_in.ndim == 4:
-        for ind0 in range(array_in.shape[0]):
-            for ind1 in range(array_in.shape[1]):
-                for ind2 in range(array_in.shape[2]):
-                    res[ind0, ind1, ind2] = RegionScalars(array_in[ind0, ind1, ind2, :])
-    else:
-        msg = "array_in.ndim=%d not handled" % array_in.ndim
-        raise ValueError(msg)
-
-    return res
+    return RegionScalarsArray(array_in)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+"""binary scratch format for solver-internal ModelStateBase intermediates"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+
+import numpy as np
+from netCDF4 import Dataset
+
+from .utils import create_dimensions_verify, create_vars, netcdf_format
+
+# suffix of scratch fnames
+# a scratch file is a directory, with a .npy file for the values of each tracer
+# module, and a JSON header with the history and metadata of the tracer modules
+SCRATCH_SUFFIX = ".scratch"
+
+_HEADER_FNAME = "header.json"
+
+
+def use_scratch(solverinfo):
+    """should solver-internal files be written in the scratch format"""
+    intermediate_file_format = solverinfo.get("intermediate_file_format", "netcdf")
+    if intermediate_file_format not in ["netcdf", "scratch"]:
+        msg = "unknown intermediate_file_format=%s" % intermediate_file_format
+        raise ValueError(msg)
+    return intermediate_file_format == "scratch"
+
+
+def is_scratch_fname(fname):
+    """is fname the name of a scratch file"""
+    return fname.endswith(SCRATCH_SUFFIX)
+
+
+def write_scratch(fname, history, contents):
+    """
+    write a scratch file
+    contents is a dict, keyed by tracer module name, of (vals, metadata) tuples,
+    where metadata is a dict with keys tracer_names and dimensions
+    """
+    os.makedirs(fname, exist_ok=True)
+    header = {"history": history, "tracer_modules": {}}
+    for tracer_module_name, (vals, metadata) in contents.items():
+        _replace_file(
+            os.path.join(fname, tracer_module_name + ".npy"),
+            lambda fptr, vals=vals: np.save(fptr, vals),
+        )
+        header["tracer_modules"][tracer_module_name] = metadata
+    _replace_file(
+        os.path.join(fname, _HEADER_FNAME),
+        lambda fptr: fptr.write(json.dumps(header, indent=2).encode()),
+    )
+
+
+def _replace_file(fname, write_fcn):
+    """
+    write a file with write_fcn, via a temporary file that then replaces fname
+    this leaves memory-mapped contents of an existing fname intact
+    """
+    fname_tmp = fname + ".tmp"
+    with open(fname_tmp, mode="wb") as fptr:
+        write_fcn(fptr)
+    os.replace(fname_tmp, fname)
+
+
+def read_scratch_header(fname):
+    """return header of a scratch file"""
+    with open(os.path.join(fname, _HEADER_FNAME), mode="r") as fptr:
+        return json.load(fptr)
+
+
+def read_scratch_vals(fname, tracer_module_name):
+    """
+    return values and dimension names and lengths of a tracer module in a scratch
+    file
+    values are memory-mapped copy-on-write, so modifying them leaves the file intact
+    """
+    metadata = read_scratch_header(fname)["tracer_modules"][tracer_module_name]
+    vals = np.load(os.path.join(fname, tracer_module_name + ".npy"), mmap_mode="c")
+    return vals, metadata["dimensions"]
+
+
+def scratch_to_netcdf(fname, fname_out):
+    """convert a scratch file to a netCDF file, e.g., for debugging"""
+    header = read_scratch_header(fname)
+    with Dataset(fname_out, mode="w", format=netcdf_format()) as fptr:
+        datestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        msg = datestamp + ": converted from " + fname + " by " + __name__
+        fptr.history = "\n".join([msg, header["history"]])
+        for action in ["define", "write"]:
+            for tracer_module_name, metadata in header["tracer_modules"].items():
+                dimensions = metadata["dimensions"]
+                if action == "define":
+                    create_dimensions_verify(fptr, dimensions)
+                    vars_metadata = {
+                        tracer_name: {"dimensions": tuple(dimensions)}
+                        for tracer_name in metadata["tracer_names"]
+                    }
+                    create_vars(fptr, vars_metadata)
+                else:
+                    vals, _ = read_scratch_vals(fname, tracer_module_name)
+                    for ind, tracer_name in enumerate(metadata["tracer_names"]):
+                        fptr.variables[tracer_name][:] = vals[ind, :]
+
+
+def parse_args(args_list_in=None):
+    """parse command line arguments"""
+
+    args_list = [] if args_list_in is None else args_list_in
+    parser = argparse.ArgumentParser(
+        description="convert scratch file to netCDF file",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+
+    parser.add_argument("fname", help="name of scratch file to be converted")
+    parser.add_argument("fname_out", help="name of netCDF file to be written")
+
+    return parser.parse_args(args_list)
+
+
+def main(args):
+    """convert scratch file to netCDF file"""
+    scratch_to_netcdf(args.fname, args.fname_out)
+
+
+if __name__ == "__main__":
+    main(parse_args(sys.argv[1:]))
@@ -33,6 +33,7 @@ class SolverState:
         self._workdir = workdir
         self._state_fname = os.path.join(self._workdir, name + "_state.json")
         self._rewound_step_string = None
+        self._deferred_step_log_strings = []
         if resume:
             self._read_saved_state()
             self._log_saved_state()
@@ -82,10 +83,35 @@ class SolverState:
         else:
             logger.debug('"%s" already in step_log', stepval)
 
+    def defer_log_step(self, stepval, per_iteration=True):
+        """
+        add a step to step_log when log_deferred_steps is called
+        this is for steps whose results are buffered until they are written
+        """
+        logger = logging.getLogger(__name__)
+        logger.debug('name="%s"', self._name)
+        if not self.step_logged(stepval, per_iteration):
+            logger.debug('deferring adding "%s" to step_log', stepval)
+            log_string = self._step_log_string(stepval, per_iteration)
+            self._deferred_step_log_strings.append(log_string)
+        else:
+            logger.debug('"%s" already in step_log', stepval)
+
+    def log_deferred_steps(self):
+        """add deferred steps to step_log"""
+        if not self._deferred_step_log_strings:
+            return
+        self._saved_state["step_log"].extend(self._deferred_step_log_strings)
+        self._deferred_step_log_strings = []
+        self._write_saved_state()
+
     def step_logged(self, stepval, per_iteration=True):
-        """has step been logged in the current iteration"""
+        """has step been logged, or deferred, in the current iteration"""
         log_string = self._step_log_string(stepval, per_iteration)
-        return log_string in self._saved_state["step_log"]
+        return (
+            log_string in self._saved_state["step_log"]
+            or log_string in self._deferred_step_log_strings
+        )
 
     def step_was_rewound(self, stepval, per_iteration=True):
         """does stepval correspond to the step that was rewound during __init__"""
@@ -158,7 +184,7 @@ def json_ndarray_decode(dct):
     return dct
 
 
-def action_step_log_wrap(step, per_iteration=True, post_exit=False):
+def action_step_log_wrap(step, per_iteration=True, post_exit=False, deferred=False):
     """
     Decorator for wrapping functions with args inside step_logged/log_step checks.
     It is for functions that perform actions and don't return values.
@@ -166,6 +192,8 @@ def action_step_log_wrap(step, per_iteration=True, post_exit=False):
     step is the string argument getting passed to sover_state methods.
     Formatting using .format is applied to step, using the keyword arguments of func,
     to enable step to depend on func's arguments.
+    If deferred is True, step is logged with defer_log_step, for functions whose
+    actions are buffered until log_deferred_steps is called.
     """
 
     def outer_wrapper(func):
@@ -177,7 +205,10 @@ def action_step_log_wrap(step, per_iteration=True, post_exit=False):
                     return
             func(*args, **kwargs)
             if solver_state is not None:
-                solver_state.log_step(step.format(**kwargs), per_iteration)
+                if deferred:
+                    solver_state.defer_log_step(step.format(**kwargs), per_iteration)
+                else:
+                    solver_state.log_step(step.format(**kwargs), per_iteration)
             if post_exit:
                 raise SystemExit
 
@@ -7,14 +7,34 @@ from netCDF4 import Dataset, default_fillvals
 
 from .model_config import get_region_cnt
 from .solver_state import action_step_log_wrap
-from .utils import class_name, create_dimensions_verify, create_vars
+from .utils import (
+    class_name,
+    create_dimensions_verify,
+    create_vars,
+    dict_update_verify,
+    netcdf_format,
+)
 
 
 class StatsFile:
-    """class for stats for a solver"""
+    """
+    class for stats for a solver
+
+    Definitions and values are buffered in memory, and written to the file in a
+    single transaction by flush. Steps of solver_state whose results are buffered
+    should be logged with defer_log_step. flush logs them after the buffered results
+    are written, so that the step log does not get ahead of the file contents.
+    """
 
     def __init__(self, name, workdir, solver_state):
         self._fname = os.path.join(workdir, name + "_stats.nc")
+        self._solver_state = solver_state
+
+        self._pending_dimensions = {}
+        self._pending_vars_metadata = {}
+        self._pending_history = []
+        self._pending_vals_iteration_invariant = {}
+        self._pending_vals = {}
 
         self._create_stats_file(name=name, fname=self._fname, solver_state=solver_state)
 
@@ -23,7 +43,7 @@ class StatsFile:
     def _create_stats_file(self, name, fname, solver_state):
         """create the stats file, along with required dimensions"""
 
-        with Dataset(fname, mode="w", format="NETCDF3_64BIT_OFFSET") as fptr:
+        with Dataset(fname, mode="w", format=netcdf_format()) as fptr:
             datestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             fcn_name = class_name(self) + "._create_stats_file"
             msg = datestamp + ": created by " + fcn_name + " for " + name + " solver"
@@ -48,71 +68,108 @@ class StatsFile:
             create_vars(fptr, vars_metadata)
 
     def def_dimensions(self, dimensions):
-        """define dimensions in stats file"""
-        with Dataset(self._fname, mode="a") as fptr:
-            create_dimensions_verify(fptr, dimensions)
+        """define dimensions in stats file, when flush is called"""
+        dict_update_verify(self._pending_dimensions, dimensions)
 
     def def_vars(self, vars_metadata, caller=None):
-        """define vars in stats file"""
-        with Dataset(self._fname, mode="a") as fptr:
-            # stats vars must have a _FillValue, for actively filling when iteration
-            # dimension grows
-            for metadata in vars_metadata.values():
-                if "attrs" not in metadata:
-                    metadata["attrs"] = {}
-                if "_FillValue" not in metadata["attrs"]:
-                    datatype = metadata.get("datatype", "f8")
-                    metadata["attrs"]["_FillValue"] = default_fillvals[datatype]
-            create_vars(fptr, vars_metadata)
-            if caller is not None:
-                datestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                varnames = ",".join(vars_metadata)
-                fcn_name = class_name(self) + ".def_vars"
-                msg = datestamp + ": " + varnames + " appended by " + fcn_name
-                msg = msg + " called by " + caller
-                fptr.history = "\n".join([msg, fptr.history])
+        """define vars in stats file, when flush is called"""
+        # stats vars must have a _FillValue, for actively filling when iteration
+        # dimension grows
+        for metadata in vars_metadata.values():
+            if "attrs" not in metadata:
+                metadata["attrs"] = {}
+            if "_FillValue" not in metadata["attrs"]:
+                datatype = metadata.get("datatype", "f8")
+                metadata["attrs"]["_FillValue"] = default_fillvals[datatype]
+        dict_update_verify(self._pending_vars_metadata, vars_metadata)
+        if caller is not None:
+            datestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            varnames = ",".join(vars_metadata)
+            fcn_name = class_name(self) + ".def_vars"
+            msg = datestamp + ": " + varnames + " appended by " + fcn_name
+            msg = msg + " called by " + caller
+            self._pending_history.append(msg)
 
     def put_vars_iteration_invariant(self, name_vals_dict):
         """
-        write iteration-invariant values to stats file
+        write iteration-invariant values to stats file, when flush is called
         name_vals_dict is a dict of (varname, vals) pairs
         """
-        # if there is nothing to write return immediately
-        if name_vals_dict == {}:
-            return
-        with Dataset(self._fname, mode="a") as fptr:
-            for name, vals in name_vals_dict.items():
-                if "iteration" in fptr.variables[name].dimensions:
-                    msg = "iteration is a dimension for %s" % name
-                    raise RuntimeError(msg)
-                fptr.variables[name][:] = vals
+        self._pending_vals_iteration_invariant.update(name_vals_dict)
 
     def put_vars(self, iteration, name_vals_dict):
         """
-        write values to stats file for a particular iteration index
+        write values to stats file for a particular iteration index, when flush is
+        called
         name_vals_dict is a dict of (varname, vals) pairs
         where vals are specific to this iteration
         """
         # if there is nothing to write return immediately
         if name_vals_dict == {}:
             return
-        with Dataset(self._fname, mode="a") as fptr:
-            if iteration == len(fptr.variables["iteration"]):
-                _grow_iteration(fptr)
-            for name, vals in name_vals_dict.items():
+        self._pending_vals.setdefault(iteration, {}).update(name_vals_dict)
+
+    def flush(self):
+        """
+        write buffered definitions and values to stats file, in a single
+        transaction, and then log deferred steps of solver_state
+        """
+        if (
+            self._pending_dimensions
+            or self._pending_vars_metadata
+            or self._pending_vals_iteration_invariant
+            or self._pending_vals
+        ):
+            with Dataset(self._fname, mode="a") as fptr:
+                self._flush_defs(fptr)
+                self._flush_vals(fptr)
+        if self._solver_state is not None:
+            self._solver_state.log_deferred_steps()
+
+    def _flush_defs(self, fptr):
+        """write buffered definitions to stats file"""
+        if self._pending_dimensions:
+            create_dimensions_verify(fptr, self._pending_dimensions)
+            self._pending_dimensions = {}
+        if self._pending_vars_metadata:
+            create_vars(fptr, self._pending_vars_metadata)
+            self._pending_vars_metadata = {}
+        if self._pending_history:
+            fptr.history = "\n".join(self._pending_history[::-1] + [fptr.history])
+            self._pending_history = []
+
+    def _flush_vals(self, fptr):
+        """write buffered values to stats file"""
+        for name, vals in self._pending_vals_iteration_invariant.items():
+            if "iteration" in fptr.variables[name].dimensions:
+                msg = "iteration is a dimension for %s" % name
+                raise RuntimeError(msg)
+            fptr.variables[name][:] = vals
+        self._pending_vals_iteration_invariant = {}
+
+        for iteration in sorted(self._pending_vals):
+            name_vals_dict = self._pending_vals[iteration]
+            for name in name_vals_dict:
                 if "iteration" not in fptr.variables[name].dimensions:
                     msg = "iteration is not a dimension for %s" % name
                     raise RuntimeError(msg)
+            if iteration == len(fptr.variables["iteration"]):
+                _grow_iteration(fptr, name_vals_dict.keys())
+            for name, vals in name_vals_dict.items():
                 fptr.variables[name][iteration, :] = vals
+        self._pending_vals = {}
 
 
-def _grow_iteration(fptr):
-    """grow iteration dimension"""
+def _grow_iteration(fptr, varnames_written):
+    """
+    grow iteration dimension
+    vars in varnames_written are not filled, because they are about to be written
+    """
     # Set variables to fill_value. Without doing the fill, some installs of ncview
     # abort when viewing the stats file.
     iteration = len(fptr.variables["iteration"])
     for var in fptr.variables.values():
         if var.name == "iteration":
             var[iteration] = iteration
-        elif var.dimensions[0] == "iteration":
+        elif var.dimensions[0] == "iteration" and var.name not in varnames_written:
             var[iteration, :] = var._FillValue  # pylint: disable=protected-access
@@ -1,7 +1,7 @@
 """dye_decay subclass of test_problem's TracerModuleState"""
 
 import numpy as np
-from scipy.linalg import solve_banded
+from scipy.sparse import identity
 
 from .tracer_module_state import TracerModuleState
 
@@ -9,6 +9,8 @@ from .tracer_module_state import TracerModuleState
 class dye_decay(TracerModuleState):  # pylint: disable=invalid-name
     """dye_decay tracer module specifics for TracerModuleState"""
 
+    is_linear = True
+
     def __init__(self, tracer_module_name, fname, depth):
         super().__init__(tracer_module_name, fname, depth)
 
@@ -30,6 +32,19 @@ class dye_decay(TracerModuleState):  # pylint: disable=invalid-name
         dtracer_vals_dt_flat[:] -= int(suff) * 0.001 / 365.0 * tracer_vals_flat[:]
         return dtracer_vals_dt_flat
 
+    def comp_jacobian(self, time, tracer_vals_flat, vert_mix):
+        """
+        compute sparse jacobian of tendency for dye_decay tracer
+        d tend[k] / d tracer_vals_flat[j] is the [k, j] entry
+        """
+        # surface flux does not depend on tracer values
+        # decay (suff / 1000) / y
+        suff = self.name[10:]
+        decay_rate = int(suff) * 0.001 / 365.0
+        return vert_mix.tend_jacobian(time) - decay_rate * identity(
+            len(tracer_vals_flat), format="csc"
+        )
+
     def _dye_decay_surf_flux(self, time):
         """return surf flux applied to dye_decay tracers"""
         if time != self._dye_decay_surf_flux_time:
@@ -45,7 +60,15 @@ class dye_decay(TracerModuleState):  # pylint: disable=invalid-name
         self_vals = self.get_tracer_vals_all()[0, :]
         rhs_vals = (1.0 / (time_range[1] - time_range[0])) * self_vals
 
-        l_and_u = (1, 1)
+        res_vals = self._precond_tridiag_solve(mca, rhs_vals)
+
+        res_tms.set_tracer_vals_all(res_vals - self_vals)
+
+    def _precond_matrix_diagonals(self, mca):
+        """
+        return diagonals of tridiagonal preconditioner matrix of jacobian of dye_decay
+        fcn, in the layout of scipy.linalg.solve_banded
+        """
         matrix_diagonals = np.zeros((3, len(self.depth)))
         # d tend[k] / d tracer[k-1]
         matrix_diagonals[0, 1:] = mca * self.depth.delta_mid_r * self.depth.delta_r[:-1]
@@ -61,6 +84,4 @@ class dye_decay(TracerModuleState):  # pylint: disable=invalid-name
         suff = self.name[10:]
         matrix_diagonals[1, :] -= int(suff) * 0.001 / 365.0
 
-        res_vals = solve_banded(l_and_u, matrix_diagonals, rhs_vals)
-
-        res_tms.set_tracer_vals_all(res_vals - self_vals)
+        return matrix_diagonals
@@ -1,7 +1,7 @@
 """iage subclass of test_problem's TracerModuleState"""
 
 import numpy as np
-from scipy.linalg import solve_banded
+from scipy.sparse import diags
 
 from .tracer_module_state import TracerModuleState
 
@@ -9,6 +9,8 @@ from .tracer_module_state import TracerModuleState
 class iage(TracerModuleState):  # pylint: disable=invalid-name
     """iage tracer module specifics for TracerModuleState"""
 
+    is_linear = True
+
     @staticmethod
     def comp_tend(time, tracer_vals_flat, vert_mix):
         """
@@ -23,13 +25,31 @@ class iage(TracerModuleState):  # pylint: disable=invalid-name
         dtracer_vals_dt_flat[:] += 1.0 / 365.0
         return dtracer_vals_dt_flat
 
+    def comp_jacobian(self, time, tracer_vals_flat, vert_mix):
+        """
+        compute sparse jacobian of tendency for iage
+        d tend[k] / d tracer_vals_flat[j] is the [k, j] entry
+        """
+        # surface_flux piston velocity = 240 m / day
+        surf_flux_diag = np.zeros(len(tracer_vals_flat))
+        surf_flux_diag[0] = -240.0 * self.depth.delta_r[0]
+        return vert_mix.tend_jacobian(time) + diags(surf_flux_diag)
+
     def apply_precond_jacobian(self, time_range, res_tms, mca):
         """apply preconditioner of jacobian of iage fcn"""
 
         self_vals = self.get_tracer_vals_all()[0, :]
         rhs_vals = (1.0 / (time_range[1] - time_range[0])) * self_vals
 
-        l_and_u = (1, 1)
+        res_vals = self._precond_tridiag_solve(mca, rhs_vals)
+
+        res_tms.set_tracer_vals_all(res_vals - self_vals)
+
+    def _precond_matrix_diagonals(self, mca):
+        """
+        return diagonals of tridiagonal preconditioner matrix of jacobian of iage
+        fcn, in the layout of scipy.linalg.solve_banded
+        """
         matrix_diagonals = np.zeros((3, len(self.depth)))
         # d tend[k] / d tracer[k-1]
         matrix_diagonals[0, 1:] = mca * self.depth.delta_mid_r * self.depth.delta_r[:-1]
@@ -42,6 +62,4 @@ class iage(TracerModuleState):  # pylint: disable=invalid-name
         # d tend[k] / d tracer[k+1]
         matrix_diagonals[2, :-1] = mca * self.depth.delta_mid_r * self.depth.delta_r[1:]
 
-        res_vals = solve_banded(l_and_u, matrix_diagonals, rhs_vals)
-
-        res_tms.set_tracer_vals_all(res_vals - self_vals)
+        return matrix_diagonals
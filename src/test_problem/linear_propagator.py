@@ -0,0 +1,114 @@
+"""propagators of tracer modules whose tendencies are affine in tracer values"""
+
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sys
+
+import numpy as np
+from scipy.integrate import solve_ivp
+from scipy.sparse import identity, kron
+
+from ..utils import mkdir_exist_okay
+from .vert_mix import VertMix
+
+# propagators that have been read or computed, keyed by fname
+_propagators = {}
+
+
+def linear_propagator(tracer_module, time_range, vert_mix, cache_dir):
+    """
+    return (matrix, offset) of the propagator of tracer_module over time_range,
+    such that integrating tracer values vals over time_range yields
+    matrix @ vals + offset, where vals is the flattened tracer values
+    the propagator is cached in cache_dir, and only computed if it is not there
+    """
+    fname = _propagator_fname(tracer_module, time_range, cache_dir)
+    if fname not in _propagators:
+        if os.path.exists(fname):
+            with np.load(fname) as fptr:
+                _propagators[fname] = (fptr["matrix"], fptr["offset"])
+        else:
+            matrix, offset = _comp_propagator(tracer_module, time_range, vert_mix)
+            mkdir_exist_okay(cache_dir)
+            # write to a temporary file, so that a partially written file is not used
+            fname_tmp = fname + ".tmp.npz"
+            np.savez(fname_tmp, matrix=matrix, offset=offset)
+            os.replace(fname_tmp, fname)
+            _propagators[fname] = (matrix, offset)
+    return _propagators[fname]
+
+
+def _propagator_fname(tracer_module, time_range, cache_dir):
+    """
+    return name of file that propagator of tracer_module is cached in
+    the name includes a hash of everything that the propagator depends on, so
+    that a changed depth axis, parameter, or tendency code yields a new file
+    """
+    key = {
+        "name": tracer_module.name,
+        "tracer_module_def": tracer_module._tracer_module_def,
+        "depth_edges": tracer_module.depth.edges.tolist(),
+        "time_range": list(time_range),
+        "source": [
+            inspect.getsource(type(tracer_module)),
+            inspect.getsource(VertMix),
+            inspect.getsource(sys.modules[__name__]),
+        ],
+    }
+    key_str = json.dumps(key, sort_keys=True, default=str)
+    key_hash = hashlib.sha256(key_str.encode()).hexdigest()[:16]
+    return os.path.join(
+        cache_dir, "propagator_%s_%s.npz" % (tracer_module.name, key_hash)
+    )
+
+
+def _comp_propagator(tracer_module, time_range, vert_mix):
+    """
+    compute propagator of tracer_module over time_range, by integrating, in a
+    single batch, the identity columns and zero tracer values
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("computing propagator for %s", tracer_module.name)
+
+    vals_len = tracer_module.tracer_cnt * len(tracer_module.depth)
+    batch_cnt = vals_len + 1
+    vals_init = np.zeros((batch_cnt, vals_len))
+    vals_init[:vals_len, :] = np.eye(vals_len)
+
+    sol = solve_ivp(
+        _comp_tend_batch,
+        time_range,
+        vals_init.reshape(-1),
+        "Radau",
+        atol=1.0e-10,
+        rtol=1.0e-10,
+        jac=_comp_jacobian_batch,
+        args=(tracer_module, vert_mix, batch_cnt),
+    )
+    vals_final = sol.y[:, -1].reshape((batch_cnt, vals_len))
+
+    offset = vals_final[-1, :]
+    # column j of matrix is the response to the j-th identity column
+    matrix = (vals_final[:vals_len, :] - offset).transpose().copy()
+    return matrix, offset
+
+
+def _comp_tend_batch(time, vals_flat, tracer_module, vert_mix, batch_cnt):
+    """tendency of a batch of tracer values for tracer_module"""
+    vals = vals_flat.reshape((batch_cnt, -1))
+    return np.concatenate(
+        [tracer_module.comp_tend(time, vals_one, vert_mix) for vals_one in vals]
+    )
+
+
+def _comp_jacobian_batch(time, vals_flat, tracer_module, vert_mix, batch_cnt):
+    """
+    jacobian of tendency of a batch of tracer values for tracer_module
+    the jacobian does not depend on tracer values, because the tendency is affine
+    """
+    vals_len = len(vals_flat) // batch_cnt
+    jacobian = tracer_module.comp_jacobian(time, vals_flat[:vals_len], vert_mix)
+    return kron(identity(batch_cnt), jacobian, format="csc")
@@ -1,11 +1,14 @@
 #!/usr/bin/env python
 """test_problem model specifics for ModelStateBase"""
 
+import atexit
 import copy
 import logging
+import multiprocessing
 import os
 import subprocess
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 from distutils.util import strtobool
 from inspect import signature
@@ -14,10 +17,19 @@ import numpy as np
 from netCDF4 import Dataset
 from scipy.integrate import solve_ivp
 
+from .. import model_config
 from ..model_config import ModelConfig, get_modelinfo
 from ..model_state_base import ModelStateBase
 from ..share import args_replace, common_args, logging_config, read_cfg_file
-from ..utils import class_name, create_dimensions_verify, create_vars
+from ..utils import (
+    class_name,
+    create_dimensions_verify,
+    create_vars,
+    dict_update_verify,
+    netcdf_format,
+    set_netcdf_opts,
+)
+from .linear_propagator import linear_propagator
 from .spatial_axis import SpatialAxis
 from .vert_mix import VertMix
 
@@ -63,6 +75,7 @@ def main(args):
     solverinfo = config["solverinfo"]
 
     logging_config(args, solverinfo, filemode="a")
+    set_netcdf_opts(solverinfo)
     logger = logging.getLogger(__name__)
 
     logger.info('args.cmd="%s"', args.cmd)
@@ -102,19 +115,60 @@ def main(args):
     logger.info("done")
 
 
+# process pools used to integrate tracer modules, keyed by process count
+_integrate_executors = {}
+
+
+def _integrate_executor(process_cnt):
+    """return process pool used to integrate tracer modules, creating it on first use"""
+    if process_cnt not in _integrate_executors:
+        # do not fork, forking a process that has started threads, e.g., those of
+        # reduction thread pools, is unsafe
+        executor = ProcessPoolExecutor(
+            max_workers=process_cnt,
+            mp_context=multiprocessing.get_context("forkserver"),
+        )
+        atexit.register(executor.shutdown)
+        _integrate_executors[process_cnt] = executor
+    return _integrate_executors[process_cnt]
+
+
+def _integrate_tracer_module(
+    tracer_module, time_range, tracer_vals_flat, t_eval, vert_mix
+):
+    """integrate ODEs of tracer_module, using scipy.integrate"""
+    return solve_ivp(
+        tracer_module.comp_tend,
+        time_range,
+        tracer_vals_flat,
+        "Radau",
+        t_eval,
+        atol=1.0e-10,
+        rtol=1.0e-10,
+        jac=tracer_module.comp_jacobian,
+        args=(vert_mix,),
+    )
+
+
+# keyword arguments, read from a precond file, for apply_precond_jacobian of tracer
+# modules, keyed by precond file identity
+# only the most recently read precond file is retained
+_precond_kwargs_cache = {}
+
+
 class ModelState(ModelStateBase):
     """test_problem model specifics for ModelStateBase"""
 
     # give ModelState operators higher priority than those of numpy
     __array_priority__ = 100
 
-    def __init__(self, fname):
+    def __init__(self, fname, lazy_vals=False):
         self.time_range = (0.0, 365.0)
         self.depth = SpatialAxis(axisname="depth", fname=get_modelinfo("depth_fname"))
 
         self.vert_mix = VertMix(self.depth)
 
-        super().__init__(fname)
+        super().__init__(fname, lazy_vals)
 
     def get_tracer_vals_all(self):
         """get all tracer values"""
@@ -156,7 +210,7 @@ class ModelState(ModelStateBase):
             fcn_complete_step = "comp_fcn complete for %s" % res_fname
             if solver_state.step_logged(fcn_complete_step):
                 logger.debug('"%s" logged, returning result', fcn_complete_step)
-                return ModelState(res_fname)
+                return ModelState(res_fname, lazy_vals=True)
             logger.debug('"%s" not logged, proceeding', fcn_complete_step)
 
         # get dense output, if requested
@@ -168,34 +222,36 @@ class ModelState(ModelStateBase):
         # memory for result, use it initially for passing initial value to solve_ivp
         res_vals = self.get_tracer_vals_all()
 
-        fptr_hist = self._hist_def_dimensions(hist_fname)
-        self._hist_def_vars_tracer_module_independent(fptr_hist)
-
-        # solve ODEs for each tracer module independently, using scipy.integrate
+        propagators = [
+            self._linear_propagator(tracer_module)
+            for tracer_module in self.tracer_modules
+        ]
+
+        # solve ODEs for each tracer module independently
+        # tracer modules with a propagator are only integrated for dense output, and
+        # their end values are taken from the propagator regardless, so that results
+        # do not depend on whether hist output is requested
+        # keep solutions in memory, so that hist file is written in one pass
+        integrate_flags = [
+            propagator is None or hist_fname is not None for propagator in propagators
+        ]
+        sols = self._integrate_tracer_modules(res_vals, t_eval, integrate_flags)
         ind0 = 0
-        for tracer_module in self.tracer_modules:
-            self._hist_def_vars(tracer_module, fptr_hist)
+        for tracer_module, sol, propagator in zip(
+            self.tracer_modules, sols, propagators
+        ):
             cnt = tracer_module.tracer_cnt
-            sol = solve_ivp(
-                tracer_module.comp_tend,
-                self.time_range,
-                res_vals[ind0 : ind0 + cnt, :].reshape(-1),
-                "Radau",
-                t_eval,
-                atol=1.0e-10,
-                rtol=1.0e-10,
-                args=(self.vert_mix,),
-            )
-            if ind0 == 0:
-                self._hist_write_tracer_module_independent(sol, fptr_hist)
-            self._hist_write(tracer_module, sol, fptr_hist)
+            if propagator is None:
+                vals_end = sol.y[:, -1]
+            else:
+                matrix, offset = propagator
+                vals_end = matrix @ res_vals[ind0 : ind0 + cnt, :].reshape(-1) + offset
             res_vals[ind0 : ind0 + cnt, :] = (
-                sol.y[:, -1].reshape((cnt, -1)) - res_vals[ind0 : ind0 + cnt, :]
+                vals_end.reshape((cnt, -1)) - res_vals[ind0 : ind0 + cnt, :]
             )
             ind0 = ind0 + cnt
 
-        if fptr_hist is not None:
-            fptr_hist.close()
+        self._hist_write_all(hist_fname, sols)
 
         # ModelState instance for result
         res_ms = copy.copy(self)
@@ -215,29 +271,113 @@ class ModelState(ModelStateBase):
 
         return res_ms
 
-    def _hist_def_dimensions(self, hist_fname):
-        """define hist dimensions"""
-        if hist_fname is None:
+    def _linear_propagator(self, tracer_module):
+        """
+        return (matrix, offset) of propagator of tracer_module over time_range
+        return None if tracer_module's tendency is not linear, or if
+        linear_propagator_dir is unset or empty
+        """
+        cache_dir = model_config.model_config_obj.modelinfo.get(
+            "linear_propagator_dir", fallback=None
+        )
+        if not tracer_module.is_linear or not cache_dir:
             return None
+        return linear_propagator(
+            tracer_module, self.time_range, self.vert_mix, cache_dir
+        )
+
+    def _integrate_tracer_modules(self, tracer_vals, t_eval, integrate_flags):
+        """
+        integrate ODEs of all tracer modules, starting from tracer_vals
+        return list of solutions from solve_ivp, in tracer module order
+        tracer modules whose integrate_flags entry is False are not integrated, and
+        their solution is None
+        if comp_fcn_process_cnt > 1, tracer modules are integrated concurrently in a
+        process pool, with those having the most tracers submitted first
+        results do not depend on comp_fcn_process_cnt
+        """
+        process_cnt = model_config.model_config_obj.modelinfo.getint(
+            "comp_fcn_process_cnt", fallback=1
+        )
 
-        # create the hist file
-        fptr_hist = Dataset(hist_fname, mode="w", format="NETCDF3_64BIT_OFFSET")
-        datestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        name = __name__ + "._gen_hist"
-        fptr_hist.history = datestamp + ": created by " + name
+        args_list = []
+        ind0 = 0
+        for tracer_module, integrate_flag in zip(self.tracer_modules, integrate_flags):
+            cnt = tracer_module.tracer_cnt
+            if not integrate_flag:
+                args_list.append(None)
+                ind0 = ind0 + cnt
+                continue
+            args_list.append(
+                (
+                    # avoid pickling tracer values when submitting to process pool
+                    tracer_module
+                    if process_cnt == 1
+                    else tracer_module.copy_for_tend(),
+                    self.time_range,
+                    tracer_vals[ind0 : ind0 + cnt, :].reshape(-1),
+                    t_eval,
+                    self.vert_mix,
+                )
+            )
+            ind0 = ind0 + cnt
+
+        if process_cnt == 1:
+            return [
+                None if args is None else _integrate_tracer_module(*args)
+                for args in args_list
+            ]
+
+        executor = _integrate_executor(process_cnt)
+        submit_order = sorted(
+            [ind for ind, args in enumerate(args_list) if args is not None],
+            key=lambda ind: -self.tracer_modules[ind].tracer_cnt,
+        )
+        futures = {
+            ind: executor.submit(_integrate_tracer_module, *args_list[ind])
+            for ind in submit_order
+        }
+        return [
+            futures[ind].result() if ind in futures else None
+            for ind in range(len(args_list))
+        ]
+
+    def _hist_write_all(self, hist_fname, sols):
+        """
+        write hist file from solutions of all tracer modules
+        all vars are defined before any are written, and each var is written once
+        """
+        if hist_fname is None:
+            return
 
-        # define dimensions
+        with Dataset(hist_fname, mode="w", format=netcdf_format()) as fptr_hist:
+            datestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            name = __name__ + "._gen_hist"
+            fptr_hist.history = datestamp + ": created by " + name
+
+            self._hist_def_dimensions(fptr_hist)
+            self._hist_def_vars_tracer_module_independent(fptr_hist)
+            for tracer_module in self.tracer_modules:
+                self._hist_def_vars(tracer_module, fptr_hist)
+
+            self._hist_write_tracer_module_independent(sols[0], fptr_hist)
+            name_vals_dict = {}
+            for tracer_module, sol in zip(self.tracer_modules, sols):
+                time_means = self._hist_write(tracer_module, sol, fptr_hist)
+                name_vals_to_add = tracer_module.stats_vars_vals_time_means(time_means)
+                dict_update_verify(name_vals_dict, name_vals_to_add)
+
+        # retain stats vars, so that put_stats_vars does not need to read hist_fname
+        self._hist_stats_vars_vals = (hist_fname, name_vals_dict)
+
+    def _hist_def_dimensions(self, fptr_hist):
+        """define hist dimensions"""
         dimensions = {"time": None}
         dimensions.update(self.depth.dump_dimensions())
         create_dimensions_verify(fptr_hist, dimensions)
 
-        return fptr_hist
-
     def _hist_def_vars_tracer_module_independent(self, fptr_hist):
         """define hist vars that are independent of tracer modules"""
-        if fptr_hist is None:
-            return
-
         # define dict of variable metadata
 
         hist_vars_metadata = {}
@@ -268,14 +408,9 @@ class ModelState(ModelStateBase):
 
         create_vars(fptr_hist, hist_vars_metadata)
 
-        fptr_hist.sync()
-
     @staticmethod
     def _hist_def_vars(tracer_module, fptr_hist):
         """define hist vars for tracer_module"""
-        if fptr_hist is None:
-            return
-
         hist_vars_metadata = tracer_module.hist_vars_metadata()
 
         # set cell_methods attribute and define hist vars
@@ -285,43 +420,31 @@ class ModelState(ModelStateBase):
 
         create_vars(fptr_hist, hist_vars_metadata)
 
-        fptr_hist.sync()
-
     def _hist_write_tracer_module_independent(self, sol, fptr_hist):
-        """define hist vars that are independent of tracer modules"""
-        if fptr_hist is None:
-            return
-
+        """write hist vars that are independent of tracer modules"""
         fptr_hist.variables["time"][:] = sol.t
 
         self.depth.dump_write(fptr_hist)
 
-        # (re-)compute and write tracer module independent vars
-        for time_ind, time in enumerate(sol.t):
-            fptr_hist.variables["bldepth"][time_ind] = self.vert_mix.bldepth(time)
-            fptr_hist.variables["mixing_coeff"][time_ind, 1:-1] = (
-                self.vert_mix.mixing_coeff(time) * self.depth.delta_mid
-            )
-            # kludge to avoid missing values
-            fptr_hist.variables["mixing_coeff"][time_ind, 0] = fptr_hist.variables[
-                "mixing_coeff"
-            ][time_ind, 1]
-            fptr_hist.variables["mixing_coeff"][time_ind, -1] = fptr_hist.variables[
-                "mixing_coeff"
-            ][time_ind, -2]
-
-        fptr_hist.sync()
+        # (re-)compute and write tracer module independent vars, for all times at once
+        fptr_hist.variables["bldepth"][:] = self.vert_mix.bldepth(sol.t)
+        mixing_coeff = np.empty((len(sol.t), len(self.depth) + 1))
+        mixing_coeff[:, 1:-1] = (
+            self.vert_mix.mixing_coeff_times(sol.t) * self.depth.delta_mid
+        )
+        # kludge to avoid missing values
+        mixing_coeff[:, 0] = mixing_coeff[:, 1]
+        mixing_coeff[:, -1] = mixing_coeff[:, -2]
+        fptr_hist.variables["mixing_coeff"][:] = mixing_coeff
 
     def _hist_write(self, tracer_module, sol, fptr_hist):
-        """write hist vars for tracer_module"""
-        if fptr_hist is None:
-            return
-
+        """
+        write hist vars for tracer_module
+        return dict of time means of tracer-like vars
+        """
         # write tracer module hist vars, providing appropriate segment of sol.y
         tracer_vals_all = sol.y.reshape((tracer_module.tracer_cnt, len(self.depth), -1))
-        tracer_module.write_hist_vars(fptr_hist, tracer_vals_all)
-
-        fptr_hist.sync()
+        return tracer_module.write_hist_vars(fptr_hist, tracer_vals_all)
 
     def apply_precond_jacobian(self, precond_fname, res_fname, solver_state):
         """apply preconditioner of jacobian of comp_fcn to model state object, self"""
@@ -332,12 +455,44 @@ class ModelState(ModelStateBase):
             fcn_complete_step = "apply_precond_jacobian complete for %s" % res_fname
             if solver_state.step_logged(fcn_complete_step):
                 logger.debug('"%s" logged, returning result', fcn_complete_step)
-                return ModelState(res_fname)
+                return ModelState(res_fname, lazy_vals=True)
             logger.debug('"%s" not logged, proceeding', fcn_complete_step)
 
         # ModelState instance for result
         res_ms = copy.deepcopy(self)
 
+        kwargs_list = self._precond_kwargs(precond_fname)
+        for tracer_module_ind, tracer_module in enumerate(self.tracer_modules):
+            tracer_module.apply_precond_jacobian(
+                self.time_range,
+                res_ms.tracer_modules[tracer_module_ind],
+                **kwargs_list[tracer_module_ind],
+            )
+
+        if solver_state is not None:
+            solver_state.log_step(fcn_complete_step)
+
+        caller = class_name(self) + ".apply_precond_jacobian"
+        return res_ms.dump(res_fname, caller)
+
+    def _precond_kwargs(self, precond_fname):
+        """
+        return list, in tracer module order, of dicts of keyword arguments, read
+        from precond_fname, for apply_precond_jacobian of tracer modules
+        values are read once per precond_fname, and reused in subsequent calls
+        the returned dicts are copies, so callers can modify them without modifying
+        the cached dicts
+        """
+        stat_result = os.stat(precond_fname)
+        key = (
+            os.path.abspath(precond_fname),
+            stat_result.st_mtime_ns,
+            stat_result.st_size,
+            tuple(tracer_module.name for tracer_module in self.tracer_modules),
+        )
+        if key in _precond_kwargs_cache:
+            return [dict(kwargs) for kwargs in _precond_kwargs_cache[key]]
+
         pos_args = ["self", "time_range", "res_tms"]
 
         arg_to_hist_dict = {
@@ -345,8 +500,9 @@ class ModelState(ModelStateBase):
             "po4_s_restore_tau_r": "po4_s_restore_tau_r_mean",
         }
 
+        kwargs_list = []
         with Dataset(precond_fname, mode="r") as fptr:
-            for tracer_module_ind, tracer_module in enumerate(self.tracer_modules):
+            for tracer_module in self.tracer_modules:
                 kwargs = {}
                 for arg in signature(tracer_module.apply_precond_jacobian).parameters:
                     if arg in pos_args:
@@ -357,16 +513,11 @@ class ModelState(ModelStateBase):
                         kwargs[arg] = hist_var[1:-1]
                     else:
                         kwargs[arg] = hist_var[:]
+                kwargs_list.append(kwargs)
 
-                tracer_module.apply_precond_jacobian(
-                    self.time_range, res_ms.tracer_modules[tracer_module_ind], **kwargs
-                )
-
-        if solver_state is not None:
-            solver_state.log_step(fcn_complete_step)
-
-        caller = class_name(self) + ".apply_precond_jacobian"
-        return res_ms.dump(res_fname, caller)
+        _precond_kwargs_cache.clear()
+        _precond_kwargs_cache[key] = kwargs_list
+        return [dict(kwargs) for kwargs in kwargs_list]
 
 
 if __name__ == "__main__":
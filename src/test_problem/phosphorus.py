@@ -1,12 +1,16 @@
 """phosphorus subclass of test_problem's TracerModuleState"""
 
 import numpy as np
-from scipy.linalg import svd
-from scipy.sparse import diags, eye
-from scipy.sparse.linalg import spsolve
+from scipy.sparse import bmat, diags, eye
+from scipy.sparse.linalg import splu
 
+from .. import model_config
 from .tracer_module_state import TracerModuleState
 
+# factorizations and null vector of preconditioner matrix, keyed by its inputs
+# only the most recently used preconditioner is retained
+_precond_factors = {}
+
 
 class phosphorus(TracerModuleState):  # pylint: disable=invalid-name
     """phosphorus tracer module specifics for TracerModuleState"""
@@ -17,11 +21,18 @@ class phosphorus(TracerModuleState):  # pylint: disable=invalid-name
         # light has e-folding decay of 25m
         self.light_lim = np.exp((-1.0 / 25.0) * depth.mid)
 
-        self._sinking_tend_work = np.zeros(1 + len(depth))
+        # sinking fluxes of pop and pop_s, bottom flux is always zero
+        self._sinking_tend_work = np.zeros((2, 1 + len(depth)))
 
         # 0: surface layer only, 1 / day
-        # 1: d po4_uptake / d po4
-        self.po4_s_restoring_opt = 1
+        # 1: d po4_uptake / d po4, finite-difference approximation
+        # 2: d po4_uptake / d po4, analytic
+        self.po4_s_restoring_opt = model_config.model_config_obj.modelinfo.getint(
+            "po4_s_restoring_opt", fallback=1
+        )
+        if self.po4_s_restoring_opt not in [0, 1, 2]:
+            msg = "unknown po4_s_restoring_opt=%d" % self.po4_s_restoring_opt
+            raise ValueError(msg)
 
     def comp_tend(self, time, tracer_vals_flat, vert_mix):
         """
@@ -34,11 +45,13 @@ class phosphorus(TracerModuleState):  # pylint: disable=invalid-name
 
         po4_uptake = self.po4_uptake(tracer_vals[0, :])
 
+        # compute tendencies of real [0:3] and shadow [3:6] tracers together,
+        # with mixing tendencies of all tracers computed in a single call
         self._comp_tend_phosphorus_core(
-            time, po4_uptake, tracer_vals[0:3, :], dtracer_vals_dt[0:3, :], vert_mix
-        )
-        self._comp_tend_phosphorus_core(
-            time, po4_uptake, tracer_vals[3:6, :], dtracer_vals_dt[3:6, :], vert_mix
+            po4_uptake,
+            tracer_vals.reshape((2, 3, -1)),
+            vert_mix.tend(time, tracer_vals).reshape((2, 3, -1)),
+            dtracer_vals_dt.reshape((2, 3, -1)),
         )
 
         # restore po4_s to po4, at a rate of 1 / day
@@ -53,13 +66,77 @@ class phosphorus(TracerModuleState):  # pylint: disable=invalid-name
 
         return dtracer_vals_dt.reshape(-1)
 
+    def comp_jacobian(self, time, tracer_vals_flat, vert_mix):
+        """
+        compute sparse jacobian of tendency for phosphorus tracers
+        d tend[k] / d tracer_vals_flat[j] is the [k, j] entry
+        the dependence of po4_s_restore_tau_r on po4 uses the analytic second
+        derivative of po4_uptake, so the jacobian is approximate if
+        po4_s_restore_tau_r is a finite-difference approximation
+        """
+
+        tracer_vals = tracer_vals_flat.reshape((6, -1))
+        po4 = tracer_vals[0, :]
+        po4_s = tracer_vals[3, :]
+
+        nlevs = len(self.depth)
+        po4_uptake = self.po4_uptake(po4)
+        d_uptake = diags(self.po4_uptake_deriv(po4))
+        # remin rates are 1% / day
+        remin = 0.01 * eye(nlevs)
+        sigma = 0.67
+
+        mix = vert_mix.tend_jacobian(time)
+        # sinking, assume velocity is 1 m / day
+        sink_diag_0 = -self.depth.delta_r.copy()
+        sink_diag_0[-1] = 0.0
+        sink = diags([self.depth.delta_r[1:], sink_diag_0], [-1, 0])
+
+        # restoring term, rest_term = po4_s_restore_tau_r * (po4 - po4_s)
+        tau_r = self.po4_s_restore_tau_r(po4, po4_uptake)
+        if self.po4_s_restoring_opt == 0:
+            d_tau_r = np.zeros(nlevs)
+        else:
+            d_tau_r = self.po4_uptake_deriv2(po4)
+        d_rest_d_po4 = diags(tau_r + d_tau_r * (po4 - po4_s))
+        d_rest_d_po4_s = diags(-tau_r)
+
+        blocks = [
+            [mix - d_uptake, remin, remin, None, None, None],
+            [sigma * d_uptake, mix - remin, None, None, None, None],
+            [(1.0 - sigma) * d_uptake, None, mix - remin + sink, None, None, None],
+            [-d_uptake + d_rest_d_po4, None, None, mix + d_rest_d_po4_s, remin, remin],
+            [
+                sigma * d_uptake - 0.67 * d_rest_d_po4,
+                None,
+                None,
+                -0.67 * d_rest_d_po4_s,
+                mix - remin,
+                None,
+            ],
+            [
+                (1.0 - sigma) * d_uptake - 0.33 * d_rest_d_po4,
+                None,
+                None,
+                -0.33 * d_rest_d_po4_s,
+                None,
+                mix - remin + sink,
+            ],
+        ]
+        return bmat(blocks, format="csc")
+
     def po4_s_restore_tau_r(self, po4, po4_uptake):
-        """inverse timescale for po4_s restoring"""
+        """
+        inverse timescale for po4_s restoring
+        po4 has depth as its last dimension
+        """
 
         if self.po4_s_restoring_opt == 0:
             # 1 / day in top layer
             res = np.zeros(po4.shape)
-            res[0] = 1.0
+            res[..., 0] = 1.0
+        elif self.po4_s_restoring_opt == 2:
+            res = self.po4_uptake_deriv(po4)
         else:
             # finite-difference approximation to d po4_uptake / d po4
             po4_delta = 1.0e-3 * abs(po4)
@@ -76,17 +153,26 @@ class phosphorus(TracerModuleState):  # pylint: disable=invalid-name
         po4_lim = po4 / (po4 + 0.5)
         return self.light_lim * po4_lim
 
+    def po4_uptake_deriv(self, po4):
+        """return d po4_uptake / d po4, [d-1]"""
+        return self.light_lim * 0.5 / (po4 + 0.5) ** 2
+
+    def po4_uptake_deriv2(self, po4):
+        """return d^2 po4_uptake / d po4^2, [m3 mmol-1 d-1]"""
+        return -self.light_lim / (po4 + 0.5) ** 3
+
     def _comp_tend_phosphorus_core(
-        self, time, po4_uptake, tracer_vals, dtracer_vals_dt, vert_mix
+        self, po4_uptake, tracer_vals, mix_tend, dtracer_vals_dt
     ):
         """
         core fuction for computing tendency for phosphorus tracers
+        tracer_vals, mix_tend, and dtracer_vals_dt have dimensions
+            (set, tracer, depth), where set indexes real and shadow tracers
         tendency units are tr_units / day
         """
 
-        po4 = tracer_vals[0, :]
-        dop = tracer_vals[1, :]
-        pop = tracer_vals[2, :]
+        dop = tracer_vals[:, 1, :]
+        pop = tracer_vals[:, 2, :]
 
         # dop remin rate is 1% / day
         dop_remin = 0.01 * dop
@@ -95,26 +181,23 @@ class phosphorus(TracerModuleState):  # pylint: disable=invalid-name
 
         sigma = 0.67
 
-        dtracer_vals_dt[0, :] = (
-            -po4_uptake + dop_remin + pop_remin + vert_mix.tend(time, po4)
-        )
-        dtracer_vals_dt[1, :] = (
-            sigma * po4_uptake - dop_remin + vert_mix.tend(time, dop)
+        dtracer_vals_dt[:, 0, :] = (
+            -po4_uptake + dop_remin + pop_remin + mix_tend[:, 0, :]
         )
-        dtracer_vals_dt[2, :] = (
+        dtracer_vals_dt[:, 1, :] = sigma * po4_uptake - dop_remin + mix_tend[:, 1, :]
+        dtracer_vals_dt[:, 2, :] = (
             (1.0 - sigma) * po4_uptake
             - pop_remin
-            + vert_mix.tend(time, pop)
+            + mix_tend[:, 2, :]
             + self._sinking_tend(pop)
         )
 
     def _sinking_tend(self, tracer_vals):
-        """tracer tendency from sinking"""
-        self._sinking_tend_work[1:-1] = -tracer_vals[
-            :-1
-        ]  # assume velocity is 1 m / day
+        """tracer tendency from sinking, for (set, depth) tracer_vals"""
+        # assume velocity is 1 m / day
+        np.negative(tracer_vals[:, :-1], self._sinking_tend_work[:, 1:-1])
         return (
-            self._sinking_tend_work[1:] - self._sinking_tend_work[:-1]
+            self._sinking_tend_work[:, 1:] - self._sinking_tend_work[:, :-1]
         ) * self.depth.delta_r
 
     def hist_vars_metadata_tracer_like(self):
@@ -135,27 +218,25 @@ class phosphorus(TracerModuleState):  # pylint: disable=invalid-name
     def write_hist_vars(self, fptr, tracer_vals_all):
         """write hist vars"""
 
-        # compute po4_uptake, po4_s_restore_tau_r
+        res = super().write_hist_vars(fptr, tracer_vals_all)
+
+        # compute po4_uptake, po4_s_restore_tau_r for all times at once
+        # values have dimensions (time, depth)
         po4_ind = 1
-        po4_uptake_vals = np.empty((1, len(self.depth), tracer_vals_all.shape[-1]))
-        po4_s_restore_tau_r_vals = np.empty(
-            (1, len(self.depth), tracer_vals_all.shape[-1])
+        po4 = tracer_vals_all[po4_ind, :, :].transpose()
+        po4_uptake_vals = self.po4_uptake(po4)
+        po4_s_restore_tau_r_vals = self.po4_s_restore_tau_r(po4, po4_uptake_vals)
+
+        time_weights = self.hist_time_mean_weights(fptr)
+        res["po4_uptake"] = self.write_hist_vars_tracer_like(
+            fptr, "po4_uptake", po4_uptake_vals, time_weights
         )
-        for time_ind in range(tracer_vals_all.shape[-1]):
-            po4 = tracer_vals_all[po4_ind, :, time_ind]
-            po4_uptake_vals[0, :, time_ind] = self.po4_uptake(po4)
-            po4_s_restore_tau_r_vals[0, :, time_ind] = self.po4_s_restore_tau_r(
-                po4, po4_uptake_vals[0, :, time_ind]
-            )
-
-        # append po4_uptake to tracer_vals_all and pass up the class chain
-        super().write_hist_vars(
-            fptr,
-            np.concatenate(
-                (tracer_vals_all, po4_uptake_vals, po4_s_restore_tau_r_vals)
-            ),
+        res["po4_s_restore_tau_r"] = self.write_hist_vars_tracer_like(
+            fptr, "po4_s_restore_tau_r", po4_s_restore_tau_r_vals, time_weights
         )
 
+        return res
+
     def stats_vars_tracer_like(self):
         """
         return list of tracer-like vars in hist file to be processed for the stats file
@@ -175,6 +256,40 @@ class phosphorus(TracerModuleState):  # pylint: disable=invalid-name
         self_vals = self.get_tracer_vals_all()[3:6, :].reshape(-1)
         rhs_vals = (1.0 / (time_range[1] - time_range[0])) * self_vals
 
+        lu_a, lu_b, null_vect = self._precond_factors(mca, po4_s_restore_tau_r)
+
+        # regularize system of equations and use Richardson extrapolation to results
+        res_vals_a = lu_a.solve(rhs_vals)
+        res_vals_b = lu_b.solve(rhs_vals)
+        res_vals = 2.0 * res_vals_b - res_vals_a
+
+        dz3 = np.concatenate((self.depth.delta, self.depth.delta, self.depth.delta))
+        numer = (res_vals * dz3).sum()
+        denom = (null_vect * dz3).sum()
+        res_vals[:] -= numer / denom * null_vect
+
+        res_vals[:] = res_vals - self_vals
+        res_tms.set_tracer_vals("po4_s", res_vals[0:nlevs])
+        res_tms.set_tracer_vals("dop_s", res_vals[nlevs : 2 * nlevs])
+        res_tms.set_tracer_vals("pop_s", res_vals[2 * nlevs : 3 * nlevs])
+
+    def _precond_factors(self, mca, po4_s_restore_tau_r):
+        """
+        return sparse LU factorizations of regularized preconditioner matrices, for
+        both Richardson extrapolation shifts, and approximate null vector of
+        preconditioner matrix
+        these are computed once per preconditioner, and reused in subsequent calls
+        """
+        key = (
+            self.depth.edges.tobytes(),
+            np.asarray(mca).tobytes(),
+            np.asarray(po4_s_restore_tau_r).tobytes(),
+        )
+        if key in _precond_factors:
+            return _precond_factors[key]
+
+        nlevs = len(self.depth)
+
         matrix = diags(
             [
                 self._diag_0_phosphorus(mca, po4_s_restore_tau_r),
@@ -186,27 +301,27 @@ class phosphorus(TracerModuleState):  # pylint: disable=invalid-name
                 self._diag_m_2nlevs_phosphorus(po4_s_restore_tau_r),
             ],
             [0, 1, -1, nlevs, -nlevs, 2 * nlevs, -2 * nlevs],
-            format="csr",
+            format="csc",
         )
 
-        # regularize system of equations and use Richardson extrapolation to results
-        matrix_adj = matrix - 1.0e-11 * eye(3 * nlevs)
-        res_vals_a = spsolve(matrix_adj, rhs_vals)
-        matrix_adj = matrix - 0.5e-11 * eye(3 * nlevs)
-        res_vals_b = spsolve(matrix_adj, rhs_vals)
-        res_vals = 2.0 * res_vals_b - res_vals_a
-
-        _, sing_vals, r_sing_vects = svd(matrix.todense())
-        min_ind = sing_vals.argmin()
-        dz3 = np.concatenate((self.depth.delta, self.depth.delta, self.depth.delta))
-        numer = (res_vals * dz3).sum()
-        denom = (r_sing_vects[min_ind, :] * dz3).sum()
-        res_vals[:] -= numer / denom * r_sing_vects[min_ind, :]
-
-        res_vals[:] = res_vals - self_vals
-        res_tms.set_tracer_vals("po4_s", res_vals[0:nlevs])
-        res_tms.set_tracer_vals("dop_s", res_vals[nlevs : 2 * nlevs])
-        res_tms.set_tracer_vals("pop_s", res_vals[2 * nlevs : 3 * nlevs])
+        lu_a = splu((matrix - 1.0e-11 * eye(3 * nlevs)).tocsc())
+        lu_b = splu((matrix - 0.5e-11 * eye(3 * nlevs)).tocsc())
+
+        # inverse iteration for null vector, matrix is nearly singular, so
+        # iterations converge rapidly
+        null_vect = np.ones(3 * nlevs)
+        for _ in range(10):
+            null_vect_prev = null_vect
+            null_vect = lu_a.solve(null_vect_prev)
+            null_vect /= np.linalg.norm(null_vect)
+            if null_vect.dot(null_vect_prev) < 0.0:
+                null_vect = -null_vect
+            if np.linalg.norm(null_vect - null_vect_prev) < 1.0e-14:
+                break
+
+        _precond_factors.clear()
+        _precond_factors[key] = (lu_a, lu_b, null_vect)
+        return _precond_factors[key]
 
     def _diag_0_phosphorus(self, mca, po4_s_restore_tau_r):
         """return main diagonal of preconditioner of jacobian of phosphorus fcn"""
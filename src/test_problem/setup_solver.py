@@ -16,7 +16,7 @@ from ..share import (
     read_cfg_file,
     repro_fname,
 )
-from ..utils import mkdir_exist_okay
+from ..utils import mkdir_exist_okay, set_netcdf_opts
 from .model_state import ModelState
 from .spatial_axis import SpatialAxis, spatial_axis_defn_dict
 
@@ -62,6 +62,7 @@ def main(args):
     solverinfo = config["solverinfo"]
 
     logging_config(args, solverinfo, filemode="w")
+    set_netcdf_opts(solverinfo)
     logger = logging.getLogger(__name__)
 
     logger.info('args.cfg_fname="%s"', repro_fname(solverinfo, args.cfg_fname))
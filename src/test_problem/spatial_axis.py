@@ -5,7 +5,7 @@ from datetime import datetime
 import numpy as np
 from netCDF4 import Dataset
 
-from ..utils import class_name, create_dimensions_verify, create_vars
+from ..utils import class_name, create_dimensions_verify, create_vars, netcdf_format
 
 
 class SpatialAxis:
@@ -85,7 +85,7 @@ class SpatialAxis:
     def dump(self, fname, caller):
         """write axis information to a netCDF4 file"""
 
-        with Dataset(fname, mode="w", format="NETCDF3_64BIT_OFFSET") as fptr:
+        with Dataset(fname, mode="w", format=netcdf_format()) as fptr:
             datestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             name = class_name(self) + ".dump"
             msg = datestamp + ": generated by " + name + " called from " + caller
@@ -4,6 +4,8 @@ import logging
 
 import numpy as np
 from netCDF4 import Dataset
+from scipy.linalg import LinAlgError
+from scipy.linalg.lapack import dgttrf, dgttrs
 
 from ..model_config import get_region_cnt
 from ..tracer_module_state_base import TracerModuleStateBase
@@ -11,10 +13,15 @@ from ..utils import (
     create_dimensions_verify,
     create_vars,
     datatype_sname,
-    extract_dimensions,
+    read_vars_stacked,
     units_str_format,
 )
 
+# tridiagonal LU factorizations of preconditioner matrices, keyed by tracer module
+# name, with values (key, factors), where key identifies the factored matrix
+# only the most recent factorization for each tracer module is retained
+_precond_tridiag_factors = {}
+
 
 class TracerModuleState(TracerModuleStateBase):
     """
@@ -22,12 +29,28 @@ class TracerModuleState(TracerModuleStateBase):
     It implements _read_vals and dump.
     """
 
+    # is tendency affine in tracer values, enabling use of linear_propagator
+    is_linear = False
+
     def __init__(self, tracer_module_name, fname, depth):
 
         self.depth = depth
 
         super().__init__(tracer_module_name, fname)
 
+    def copy_for_tend(self):
+        """
+        return shallow copy of self without tracer values, for computing tendencies,
+        e.g., in another process, without pickling tracer values
+        """
+        res = type(self).__new__(type(self))
+        res.__dict__.update(self.__dict__)
+        res._vals_fname = None
+        res._vals_data = None
+        res._vals_share_cnt = [1]
+        res._reduction_cache = {}
+        return res
+
     def _read_vals(self, tracer_module_name, fname):
         """return tracer values and dimension names and lengths, read from fname)"""
         logger = logging.getLogger(__name__)
@@ -62,33 +85,16 @@ class TracerModuleState(TracerModuleStateBase):
                     raise ValueError(msg)
             return vals, {"depth": len(self.depth)}
         with Dataset(fname, mode="r") as fptr:
-            fptr.set_auto_mask(False)
-            # get dimensions from first variable
-            varname = self.tracer_names()[0]
-            dimensions = extract_dimensions(fptr, varname)
             # all tracers are stored in a single array
             # tracer index is the leading index
-            vals = np.empty((self.tracer_cnt,) + tuple(dimensions.values()))
-            # check that all vars have the same dimensions
-            for tracer_name in self.tracer_names():
-                if extract_dimensions(fptr, tracer_name) != dimensions:
-                    msg = (
-                        "not all vars have same dimensions"
-                        ", tracer_module_name=%s, fname=%s"
-                        % (tracer_module_name, fname)
-                    )
-                    raise ValueError(msg)
-            # read values
-            if len(dimensions) > 3:
-                msg = (
-                    "ndim too large (for implementation of dot_prod)"
-                    "tracer_module_name=%s, fname=%s, ndim=%s"
-                    % (tracer_module_name, fname, len(dimensions))
-                )
-                raise ValueError(msg)
-            for tracer_ind, tracer_name in enumerate(self.tracer_names()):
-                var = fptr.variables[tracer_name]
-                vals[tracer_ind, :] = var[:]
+            vals, dimensions = read_vars_stacked(fptr, self.tracer_names())
+        if len(dimensions) > 3:
+            msg = (
+                "ndim too large (for implementation of dot_prod)"
+                "tracer_module_name=%s, fname=%s, ndim=%s"
+                % (tracer_module_name, fname, len(dimensions))
+            )
+            raise ValueError(msg)
         return vals, dimensions
 
     def dump(self, fptr, action):
@@ -194,39 +200,62 @@ class TracerModuleState(TracerModuleStateBase):
         return weights
 
     def write_hist_vars(self, fptr, tracer_vals_all):
-        """write hist vars"""
+        """
+        write hist vars
+        tracer_vals_all has dimensions (tracer, depth, time)
+        return dict of time means of tracer-like vars, for use by stats_vars_vals
+        """
 
         time_weights = self.hist_time_mean_weights(fptr)
+        res = {}
 
-        for ind, tracer_like_name in enumerate(self.hist_vars_metadata_tracer_like()):
-            tracer_vals = tracer_vals_all[ind, :, :].transpose()
+        # tracer-like vars beyond tracers, if any, are written by subclasses
+        for tracer_like_name, tracer_vals in zip(
+            self.hist_vars_metadata_tracer_like(), tracer_vals_all
+        ):
+            res[tracer_like_name] = self.write_hist_vars_tracer_like(
+                fptr, tracer_like_name, tracer_vals.transpose(), time_weights
+            )
 
-            # tracer itself
-            varname = tracer_like_name
-            fptr.variables[varname][:] = tracer_vals
+        return res
 
-            # mean in time
-            varname = tracer_like_name + "_time_mean"
-            tracer_vals_mean = np.einsum("i,i...", time_weights, tracer_vals)
-            fptr.variables[varname][:] = tracer_vals_mean
+    def write_hist_vars_tracer_like(
+        self, fptr, tracer_like_name, tracer_vals, time_weights
+    ):
+        """
+        write hist vars for tracer-like var tracer_like_name
+        tracer_vals has dimensions (time, depth)
+        return time mean of tracer_vals
+        """
 
-            # anomaly in time
-            varname = tracer_like_name + "_time_anom"
-            tracer_vals_anom = tracer_vals - tracer_vals_mean
-            fptr.variables[varname][:] = tracer_vals_anom
+        # tracer itself
+        varname = tracer_like_name
+        fptr.variables[varname][:] = tracer_vals
 
-            # std dev in time
-            varname = tracer_like_name + "_time_std"
-            tracer_vals_var = np.einsum("i,i...", time_weights, tracer_vals_anom ** 2)
-            fptr.variables[varname][:] = np.sqrt(tracer_vals_var)
+        # mean in time
+        varname = tracer_like_name + "_time_mean"
+        tracer_vals_mean = np.einsum("i,i...", time_weights, tracer_vals)
+        fptr.variables[varname][:] = tracer_vals_mean
 
-            # end state minus start state
-            varname = tracer_like_name + "_time_delta"
-            fptr.variables[varname][:] = tracer_vals[-1, :] - tracer_vals[0, :]
+        # anomaly in time
+        varname = tracer_like_name + "_time_anom"
+        tracer_vals_anom = tracer_vals - tracer_vals_mean
+        fptr.variables[varname][:] = tracer_vals_anom
 
-            # depth integral
-            varname = tracer_like_name + "_depth_int"
-            fptr.variables[varname][:] = self.depth.int_vals_mid(tracer_vals)
+        # std dev in time
+        varname = tracer_like_name + "_time_std"
+        tracer_vals_var = np.einsum("i,i...", time_weights, tracer_vals_anom ** 2)
+        fptr.variables[varname][:] = np.sqrt(tracer_vals_var)
+
+        # end state minus start state
+        varname = tracer_like_name + "_time_delta"
+        fptr.variables[varname][:] = tracer_vals[-1, :] - tracer_vals[0, :]
+
+        # depth integral
+        varname = tracer_like_name + "_depth_int"
+        fptr.variables[varname][:] = self.depth.int_vals_mid(tracer_vals)
+
+        return tracer_vals_mean
 
     @staticmethod
     def stats_dimensions(fptr):
@@ -270,15 +299,49 @@ class TracerModuleState(TracerModuleStateBase):
 
     def stats_vars_vals(self, fptr_hist):
         """return tracer module specific stats variables for the current iteration"""
+        time_weights = self.hist_time_mean_weights(fptr_hist)
+        time_means = {}
+        for tracer_name in self.stats_vars_tracer_like():
+            tracer_vals = fptr_hist.variables[tracer_name][:]
+            time_means[tracer_name] = np.einsum("i,i...", time_weights, tracer_vals)
+        return self.stats_vars_vals_time_means(time_means)
+
+    def stats_vars_vals_time_means(self, time_means):
+        """
+        return tracer module specific stats variables for the current iteration,
+        from time means of tracer-like vars
+        """
 
         if get_region_cnt() != 1:
             raise NotImplementedError("region_cnt > 1 not implemented")
 
         # return values for tracer-like variables
-        time_weights = self.hist_time_mean_weights(fptr_hist)
-        res = {}
-        for tracer_name in self.stats_vars_tracer_like():
-            tracer_vals = fptr_hist.variables[tracer_name][:]
-            # assume region dimension has length 1
-            res[tracer_name] = np.einsum("i,i...", time_weights, tracer_vals)
-        return res
+        # assume region dimension has length 1
+        return {
+            tracer_name: time_means[tracer_name]
+            for tracer_name in self.stats_vars_tracer_like()
+        }
+
+    def _precond_tridiag_solve(self, mca, rhs_vals):
+        """
+        solve tridiagonal preconditioner system, with matrix from
+        _precond_matrix_diagonals, for rhs_vals
+        the LU factorization of the matrix is computed once per mca, and reused in
+        subsequent calls
+        """
+        key = (self.depth.edges.tobytes(), np.asarray(mca).tobytes())
+        if self.name not in _precond_tridiag_factors or (
+            _precond_tridiag_factors[self.name][0] != key
+        ):
+            # pylint: disable=no-member
+            matrix_diagonals = self._precond_matrix_diagonals(mca)
+            *factors, info = dgttrf(
+                matrix_diagonals[2, :-1],
+                matrix_diagonals[1, :],
+                matrix_diagonals[0, 1:],
+            )
+            if info > 0:
+                raise LinAlgError("singular matrix")
+            _precond_tridiag_factors[self.name] = (key, factors)
+        res_vals, _ = dgttrs(*_precond_tridiag_factors[self.name][1], rhs_vals)
+        return res_vals
@@ -1,6 +1,13 @@
 """functions related to vertical mixing"""
 
+from collections import OrderedDict
+
 import numpy as np
+from scipy.sparse import diags
+
+# number of times that mixing_coeff retains computed vals for
+# this covers the stage times of a few consecutive Radau steps
+_MIXING_COEFF_CACHE_SIZE = 16
 
 
 class VertMix:
@@ -10,29 +17,60 @@ class VertMix:
 
         self._depth = depth
 
-        self._mixing_coeff_time = None
-        self._mixing_coeff_vals = np.zeros(len(self._depth) - 1)
+        # computed vals, keyed by time, in order of computation
+        self._mixing_coeff_cache = OrderedDict()
 
         self._tend_work = np.zeros(len(self._depth) + 1)
 
     def tend(self, time, tracer_vals, surf_flux=0.0):
-        """single tracer tendency from mixing, with surface flux"""
-        self._tend_work[0] = -surf_flux
-        self._tend_work[1:-1] = self.mixing_coeff(time) * (
-            tracer_vals[1:] - tracer_vals[:-1]
+        """
+        tracer tendency from mixing, with surface flux
+        tracer_vals can have leading dimensions, e.g., a (tracer, depth) block, in
+        which case surf_flux is a scalar or has the leading dimensions of tracer_vals
+        """
+        tend_work = self._tend_work_for_shape(tracer_vals.shape)
+        tend_work[..., 0] = -surf_flux
+        np.subtract(tracer_vals[..., 1:], tracer_vals[..., :-1], tend_work[..., 1:-1])
+        tend_work[..., 1:-1] *= self.mixing_coeff(time)
+        return (tend_work[..., 1:] - tend_work[..., :-1]) * self._depth.delta_r
+
+    def _tend_work_for_shape(self, shape):
+        """
+        return work array for fluxes of tracer values with shape shape
+        the array is retained, so that it is not reallocated on subsequent calls
+        """
+        work_shape = shape[:-1] + (len(self._depth) + 1,)
+        if self._tend_work.shape != work_shape:
+            self._tend_work = np.zeros(work_shape)
+        return self._tend_work
+
+    def tend_jacobian(self, time):
+        """
+        sparse jacobian of single tracer tendency from mixing, excluding surface flux
+        d tend[k] / d tracer_vals[j] is the [k, j] entry
+        """
+        coeff = self.mixing_coeff(time)
+        delta_r = self._depth.delta_r
+        diag_0 = np.zeros(len(self._depth))
+        diag_0[:-1] -= coeff * delta_r[:-1]
+        diag_0[1:] -= coeff * delta_r[1:]
+        return diags(
+            [coeff * delta_r[1:], diag_0, coeff * delta_r[:-1]],
+            [-1, 0, 1],
+            format="csc",
         )
-        return (self._tend_work[1:] - self._tend_work[:-1]) * self._depth.delta_r
 
     def mixing_coeff(self, time):
         """
         vertical mixing coefficient at interior edges, divided by distance
         between layer midpoints, m d-1
-        store computed vals, so their computation can be skipped on subsequent calls
+        store computed vals for recent times, so their computation can be skipped on
+        subsequent calls, such as from other stages of a Radau step
         """
 
         # if vals have already been computed for this time, skip computation
-        if time == self._mixing_coeff_time:
-            return self._mixing_coeff_vals
+        if time in self._mixing_coeff_cache:
+            return self._mixing_coeff_cache[time]
 
         bldepth = self.bldepth(time)
         res_log10_shallow = 0.0
@@ -42,11 +80,31 @@ class VertMix:
             [bldepth - 20.0, bldepth + 20.0],
             [res_log10_shallow, res_log10_deep],
         )
-        self._mixing_coeff_time = time
-        self._mixing_coeff_vals[:] = (
-            86400.0 * 10.0 ** res_log10 * self._depth.delta_mid_r
-        )
-        return self._mixing_coeff_vals
+        vals = 86400.0 * 10.0 ** res_log10 * self._depth.delta_mid_r
+        if len(self._mixing_coeff_cache) == _MIXING_COEFF_CACHE_SIZE:
+            self._mixing_coeff_cache.popitem(last=False)
+        vals.flags.writeable = False
+        self._mixing_coeff_cache[time] = vals
+        return vals
+
+    def mixing_coeff_times(self, times):
+        """
+        vertical mixing coefficient at interior edges, divided by distance
+        between layer midpoints, m d-1, for multiple times
+        time is the leading index of the result
+        reproduces mixing_coeff, evaluating np.interp's formula for all times at once
+        """
+        bldepth = self.bldepth(np.asarray(times))[:, np.newaxis]
+        res_log10_shallow = 0.0
+        res_log10_deep = -5.0
+        edges_shallow = bldepth - 20.0
+        edges_deep = bldepth + 20.0
+        slope = (res_log10_deep - res_log10_shallow) / (edges_deep - edges_shallow)
+        edges = self._depth.edges[1:-1]
+        res_log10 = slope * (edges - edges_shallow) + res_log10_shallow
+        res_log10 = np.where(edges <= edges_shallow, res_log10_shallow, res_log10)
+        res_log10 = np.where(edges >= edges_deep, res_log10_deep, res_log10)
+        return 86400.0 * 10.0 ** res_log10 * self._depth.delta_mid_r
 
     @staticmethod
     def bldepth(time):
@@ -1,19 +1,104 @@
 """base class for representing tracer modules, and operations on them"""
 
+import atexit
 import copy
 import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 
 from . import model_config
-from .region_scalars import RegionScalars, to_ndarray
-from .utils import attr_common
+from .region_scalars import RegionScalars, RegionScalarsArray, to_ndarray
+from .scratch_file import is_scratch_fname, read_scratch_vals
+from .utils import attr_common, region_sum
+
+# number of grid points processed together in reductions
+_REDUCTION_BLOCK_SIZE = 65536
+
+# thread pools used in reductions, keyed by thread count
+_reduction_executors = {}
+
+
+def _reduction_executor(thread_cnt):
+    """return thread pool used in reductions, creating it on first use"""
+    if thread_cnt not in _reduction_executors:
+        executor = ThreadPoolExecutor(max_workers=thread_cnt)
+        atexit.register(executor.shutdown)
+        _reduction_executors[thread_cnt] = executor
+    return _reduction_executors[thread_cnt]
+
+
+# tracer values read from files, shared by all TracerModuleStateBase objects
+# keyed by (fname, tracer_module_name, modification time, size) of the file, so that
+# entries for rewritten files are not used, and ordered by last use
+# cached values are read-only and shared with readers, which copy them on the first
+# inplace modification
+_read_cache = OrderedDict()
+
+
+def _read_cache_key(tracer_module_name, fname):
+    """return key into _read_cache, or None if fname is not a regular file"""
+    try:
+        stat_result = os.stat(fname)
+    except OSError:
+        return None
+    if not os.path.isfile(fname):
+        return None
+    return (
+        os.path.abspath(fname),
+        tracer_module_name,
+        stat_result.st_mtime_ns,
+        stat_result.st_size,
+    )
+
+
+def _read_cache_add(key, vals, dimensions):
+    """add entry to _read_cache, evicting least recently used entries over the cap"""
+    read_cache_bytes = model_config.model_config_obj.read_cache_bytes
+    if vals.nbytes > read_cache_bytes:
+        return
+    # remove entries for previous contents of the file
+    read_cache_discard(key[0], key[1])
+    vals.flags.writeable = False
+    _read_cache[key] = (vals, dimensions)
+    cache_bytes = sum(entry[0].nbytes for entry in _read_cache.values())
+    while cache_bytes > read_cache_bytes:
+        _, (vals_evicted, _) = _read_cache.popitem(last=False)
+        cache_bytes -= vals_evicted.nbytes
+
+
+def read_cache_discard(fname, tracer_module_name=None):
+    """
+    remove entries for fname from cache of tracer values read from files
+    this should be called when fname is rewritten, in case the modification time
+    resolution of the file system does not distinguish the contents
+    """
+    path = os.path.abspath(fname)
+    for key in list(_read_cache):
+        if key[0] == path and tracer_module_name in [None, key[1]]:
+            del _read_cache[key]
+
+
+def read_cache_clear():
+    """remove all entries from cache of tracer values read from files"""
+    _read_cache.clear()
 
 
 class TracerModuleStateBase:
     """
     Base class for representing a collection of model tracers.
     Derived classes should implement _read_vals and dump.
+
+    Tracer values are read by _read_vals on first access, or when load_vals is called.
+    Shallow copies share tracer values, which are copied on the first inplace
+    modification of a shared copy.
+    Values read from a file are shared, read-only, with other objects that read the
+    same unmodified file, and are copied on the first inplace modification.
+    Results of reductions (mean, dot_prod with self) are cached until tracer values are
+    modified. Inplace modifications of tracer values should be made to the array
+    returned by _mutable_vals, which invalidates the cached results.
     """
 
     # give TracerModuleStateBase operators higher priority than those of numpy
@@ -39,9 +124,83 @@ class TracerModuleStateBase:
         self.tracer_cnt = len(self._tracer_module_def["tracers"])
         # units common to all tracers
         self.units = attr_common(self._tracer_module_def["tracers"], "units")
-        self._vals, self._dimensions = self._read_vals(  # pylint: disable=no-member
-            tracer_module_name, fname
-        )
+        # defer reading of tracer values until they are accessed
+        self._vals_fname = fname
+        self._vals_data = None
+        # number of objects sharing tracer values, shared by those objects
+        self._vals_share_cnt = [1]
+        self._dimensions_data = None
+        self._reduction_cache = {}
+
+    def load_vals(self):
+        """read tracer values from file, if they have not already been read"""
+        if self._vals_fname is None:
+            return
+        if is_scratch_fname(self._vals_fname):
+            vals, dimensions = read_scratch_vals(self._vals_fname, self.name)
+        else:
+            key = _read_cache_key(self.name, self._vals_fname)
+            if key in _read_cache:
+                _read_cache.move_to_end(key)
+                vals, dimensions = _read_cache[key]
+            else:
+                vals, dimensions = self._read_vals(  # pylint: disable=no-member
+                    self.name, self._vals_fname
+                )
+                if key is not None:
+                    _read_cache_add(key, vals, dimensions)
+        self._vals_data = vals
+        self._dimensions_data = dimensions
+        self._vals_fname = None
+
+    @property
+    def _vals(self):
+        """tracer values, tracer index is the leading index"""
+        self.load_vals()
+        return self._vals_data
+
+    @_vals.setter
+    def _vals(self, vals):
+        self._unshare_vals()
+        self._vals_data = vals
+        self._reduction_cache = {}
+
+    def _mutable_vals(self):
+        """
+        return tracer values for inplace modification, invalidating cached results
+        values shared with copies of self, or with the read cache, are copied first
+        """
+        self._reduction_cache = {}
+        if self._vals_share_cnt[0] > 1 or not self._vals.flags.writeable:
+            vals = self._vals.copy()
+            self._unshare_vals()
+            self._vals_data = vals
+        return self._vals
+
+    def _unshare_vals(self):
+        """stop sharing tracer values with copies of self"""
+        self._vals_share_cnt[0] -= 1
+        self._vals_share_cnt = [1]
+
+    @property
+    def _dimensions(self):
+        """dict of dimension names and lengths of tracer values"""
+        self.load_vals()
+        return self._dimensions_data
+
+    def __copy__(self):
+        """
+        shallow copy operator
+        tracer values are read before copying, so that they are not read again by the
+        copy
+        """
+        self.load_vals()
+        res = type(self).__new__(type(self))
+        res.__dict__.update(self.__dict__)
+        # values are shared until either object modifies them inplace
+        self._vals_share_cnt[0] += 1
+        res._reduction_cache = self._reduction_cache.copy()
+        return res
 
     def tracer_names(self):
         """return list of tracer names"""
@@ -57,6 +216,16 @@ class TracerModuleStateBase:
         """
         return self.tracer_names()
 
+    def scratch_contents(self):
+        """return values and metadata of self, for writing to a scratch file"""
+        metadata = {
+            "tracer_names": self.tracer_names(),
+            "dimensions": {
+                dimname: int(dimlen) for dimname, dimlen in self._dimensions.items()
+            },
+        }
+        return self._vals, metadata
+
     def log_vals(self, msg, vals):
         """write per-tracer module values to the log"""
         logger = logging.getLogger(__name__)
@@ -64,7 +233,7 @@ class TracerModuleStateBase:
         # simplify subsequent logic by converting implicit RegionScalars dimension
         # to an additional ndarray dimension
         if (
-            isinstance(vals, RegionScalars)
+            isinstance(vals, (RegionScalars, RegionScalarsArray))
             or isinstance(vals, np.ndarray)
             and isinstance(vals.ravel()[0], RegionScalars)
         ):
@@ -116,7 +285,7 @@ class TracerModuleStateBase:
         called to evaluate self += other
         """
         if isinstance(other, TracerModuleStateBase):
-            self._vals += other._vals
+            self._mutable_vals()[:] += other._vals
         else:
             return NotImplemented
         return self
@@ -139,7 +308,7 @@ class TracerModuleStateBase:
         called to evaluate self -= other
         """
         if isinstance(other, TracerModuleStateBase):
-            self._vals -= other._vals
+            self._mutable_vals()[:] -= other._vals
         else:
             return NotImplemented
         return self
@@ -153,9 +322,7 @@ class TracerModuleStateBase:
         if isinstance(other, float):
             res._vals = self._vals * other
         elif isinstance(other, RegionScalars):
-            res._vals = self._vals * other.broadcast(
-                model_config.model_config_obj.region_mask
-            )
+            res._vals = other.scale_grid_vals(self._vals.copy())
         elif isinstance(other, TracerModuleStateBase):
             res._vals = self._vals * other._vals
         else:
@@ -175,11 +342,11 @@ class TracerModuleStateBase:
         called to evaluate self *= other
         """
         if isinstance(other, float):
-            self._vals *= other
+            self._mutable_vals()[:] *= other
         elif isinstance(other, RegionScalars):
-            self._vals *= other.broadcast(model_config.model_config_obj.region_mask)
+            other.scale_grid_vals(self._mutable_vals())
         elif isinstance(other, TracerModuleStateBase):
-            self._vals *= other._vals
+            self._mutable_vals()[:] *= other._vals
         else:
             return NotImplemented
         return self
@@ -193,9 +360,7 @@ class TracerModuleStateBase:
         if isinstance(other, float):
             res._vals = self._vals * (1.0 / other)
         elif isinstance(other, RegionScalars):
-            res._vals = self._vals * other.recip().broadcast(
-                model_config.model_config_obj.region_mask
-            )
+            res._vals = other.recip().scale_grid_vals(self._vals.copy())
         elif isinstance(other, TracerModuleStateBase):
             res._vals = self._vals / other._vals
         else:
@@ -211,9 +376,7 @@ class TracerModuleStateBase:
         if isinstance(other, float):
             res._vals = other / self._vals
         elif isinstance(other, RegionScalars):
-            res._vals = (
-                other.broadcast(model_config.model_config_obj.region_mask) / self._vals
-            )
+            res._vals = other.scale_grid_vals(1.0 / self._vals)
         else:
             return NotImplemented
         return res
@@ -224,69 +387,105 @@ class TracerModuleStateBase:
         called to evaluate self /= other
         """
         if isinstance(other, float):
-            self._vals *= 1.0 / other
+            self._mutable_vals()[:] *= 1.0 / other
         elif isinstance(other, RegionScalars):
-            self._vals *= other.recip().broadcast(
-                model_config.model_config_obj.region_mask
-            )
+            other.recip().scale_grid_vals(self._mutable_vals())
         elif isinstance(other, TracerModuleStateBase):
-            self._vals /= other._vals
+            self._mutable_vals()[:] /= other._vals
         else:
             return NotImplemented
         return self
 
     def mean(self):
         """compute weighted mean of self"""
-        ndim = len(self._dimensions)
-        # i: region dimension
-        # j: tracer dimension
-        # k,l,m : grid dimensions
-        # sum over model grid dimensions, leaving region and tracer dimensions
-        if ndim == 1:
-            tmp = np.einsum(
-                "ik,jk", model_config.model_config_obj.grid_weight, self._vals
-            )
-        elif ndim == 2:
-            tmp = np.einsum(
-                "ikl,jkl", model_config.model_config_obj.grid_weight, self._vals
-            )
-        else:
-            tmp = np.einsum(
-                "iklm,jklm", model_config.model_config_obj.grid_weight, self._vals
-            )
-        # sum over tracer dimension, and return RegionScalars object
-        return RegionScalars(np.sum(tmp, axis=-1))
+        if "mean" not in self._reduction_cache:
+            self.mean_dot_prods()
+        return RegionScalars(self._reduction_cache["mean"])
 
     def dot_prod(self, other):
         """compute weighted dot product of self with other"""
-        ndim = len(self._dimensions)
-        # i: region dimension
-        # j: tracer dimension
-        # k,l,m : grid dimensions
-        # sum over tracer and model grid dimensions, leaving region dimension
-        if ndim == 1:
-            tmp = np.einsum(
-                "ik,jk,jk",
-                model_config.model_config_obj.grid_weight,
-                self._vals,
-                other._vals,  # pylint: disable=protected-access
-            )
-        elif ndim == 2:
-            tmp = np.einsum(
-                "ikl,jkl,jkl",
-                model_config.model_config_obj.grid_weight,
-                self._vals,
-                other._vals,  # pylint: disable=protected-access
-            )
+        if other is self:
+            if "dot_prod_self" not in self._reduction_cache:
+                self.mean_dot_prods()
+            return RegionScalars(self._reduction_cache["dot_prod_self"])
+        return self.mean_dot_prods([other])[2][0]
+
+    def mean_dot_prods(self, others=()):
+        """
+        compute weighted mean of self, weighted dot product of self with self, and
+        weighted dot products of self with each TracerModuleStateBase object in others,
+        in a single pass over the values of self
+        return tuple (mean, dot_prod_self, dot_prods), where dot_prods is a list
+        """
+        if not others and {"mean", "dot_prod_self"} <= self._reduction_cache.keys():
+            res = [
+                self._reduction_cache["mean"],
+                self._reduction_cache["dot_prod_self"],
+            ]
         else:
-            tmp = np.einsum(
-                "iklm,jklm,jklm",
-                model_config.model_config_obj.grid_weight,
-                self._vals,
-                other._vals,  # pylint: disable=protected-access
-            )
-        # return RegionScalars object
-        return RegionScalars(tmp)
+            res = self._comp_mean_dot_prods(others)
+            self._reduction_cache["mean"] = res[0]
+            self._reduction_cache["dot_prod_self"] = res[1]
+        return (
+            RegionScalars(res[0]),
+            RegionScalars(res[1]),
+            [RegionScalars(vals) for vals in res[2:]],
+        )
+
+    def _comp_mean_dot_prods(self, others):
+        """
+        compute weighted mean, weighted dot product with self, and weighted dot
+        products with others, returning ndarray of per-region values
+        the leading dimension of the result has length 2 + len(others)
+        """
+        model_config_obj = model_config.model_config_obj
+        region_cnt = model_config_obj.region_cnt
+        grid_weight = model_config_obj.grid_weight.reshape(-1)
+        region_ids = model_config_obj.region_ids.reshape(-1)
+        vals = self._vals.reshape((self.tracer_cnt, -1))
+        others_vals = []
+        for other in others:
+            other_vals = other._vals  # pylint: disable=protected-access
+            others_vals.append(other_vals.reshape((self.tracer_cnt, -1)))
+
+        def block_sums(block_start):
+            """return sums of terms over one block of the grid"""
+            # j: tracer dimension
+            # k: flattened grid dimension
+            block = slice(block_start, block_start + _REDUCTION_BLOCK_SIZE)
+            vals_block = vals[:, block]
+            # sum over tracer dimension of vals, vals*vals, vals*others_vals
+            terms = np.empty((2 + len(others), vals_block.shape[-1]))
+            np.sum(vals_block, axis=0, out=terms[0])
+            np.einsum("jk,jk->k", vals_block, vals_block, out=terms[1])
+            for ind, other_vals in enumerate(others_vals):
+                np.einsum(
+                    "jk,jk->k", vals_block, other_vals[:, block], out=terms[2 + ind]
+                )
+            # sum over grid dimension, weighted by grid_weight, separately per region
+            res = np.zeros((2 + len(others), region_cnt))
+            if region_cnt == 1:
+                res[:, 0] = np.dot(terms, grid_weight[block])
+            else:
+                terms *= grid_weight[block]
+                for term_ind, term in enumerate(terms):
+                    res[term_ind] = region_sum(term, region_ids[block], region_cnt)
+            return res
+
+        # process grid in blocks, so that terms for a block are computed while the
+        # block's values are in cache, using threads if requested
+        block_starts = range(0, vals.shape[-1], _REDUCTION_BLOCK_SIZE)
+        thread_cnt = model_config_obj.reduction_thread_cnt
+        if thread_cnt > 1 and len(block_starts) > 1:
+            blocks_sums = _reduction_executor(thread_cnt).map(block_sums, block_starts)
+        else:
+            blocks_sums = map(block_sums, block_starts)
+
+        # combine block sums in a fixed order, so that results are reproducible
+        res = np.zeros((2 + len(others), region_cnt))
+        for block_sums_res in blocks_sums:
+            res += block_sums_res
+        return res
 
     def precond_matrix_list(self):
         """Return list of precond matrices being used"""
@@ -310,7 +509,10 @@ class TracerModuleStateBase:
                     res[precond_matrix_name].append(tracer_name)
 
     def get_tracer_vals_all(self):
-        """get all tracer values"""
+        """
+        get all tracer values
+        modifications to the result should be made through set_tracer_vals_all
+        """
         return self._vals
 
     def set_tracer_vals_all(self, vals, reseat_vals=False):
@@ -318,15 +520,18 @@ class TracerModuleStateBase:
         if reseat_vals:
             self._vals = vals
         else:
-            self._vals[:] = vals
+            self._mutable_vals()[:] = vals
 
     def get_tracer_vals(self, tracer_name):
-        """get tracer values"""
+        """
+        get tracer values
+        modifications to the result should be made through set_tracer_vals
+        """
         return self._vals[self.tracer_index(tracer_name), :]
 
     def set_tracer_vals(self, tracer_name, vals):
         """set tracer values"""
-        self._vals[self.tracer_index(tracer_name), :] = vals
+        self._mutable_vals()[self.tracer_index(tracer_name), :] = vals
 
     def shadow_tracers_on(self):
         """are any shadow tracers being run"""
@@ -367,13 +572,14 @@ class TracerModuleStateBase:
     def zero_extra_tracers(self):
         """set extra tracers (i.e., not being solved for) to zero"""
         for tracer_ind in self.extra_tracer_inds():
-            self._vals[tracer_ind, :] = 0.0
+            self._mutable_vals()[tracer_ind, :] = 0.0
 
     def apply_region_mask(self):
         """set _vals to zero where region_mask == 0"""
-        for tracer_ind in range(self.tracer_cnt):
-            self._vals[tracer_ind, :] = np.where(
-                model_config.model_config_obj.region_mask != 0,
-                self._vals[tracer_ind, :],
-                0.0,
-            )
+        region_mask_zero_inds = model_config.model_config_obj.region_mask_zero_inds
+        if len(region_mask_zero_inds) == 0:
+            return
+        # reshape via a view, so that an error is raised instead of silently copying
+        vals_flat = self._mutable_vals().view()
+        vals_flat.shape = (self.tracer_cnt, -1)
+        vals_flat[:, region_mask_zero_inds] = 0.0
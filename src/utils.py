@@ -110,6 +110,37 @@ def fmt_vals(var, fmt):
     return var
 
 
+################################################################################
+# utilities related to numpy arrays
+
+
+def region_sum(vals, region_ids, region_cnt, sum_ndim=None):
+    """
+    Sum vals over their last sum_ndim dimensions, separately for each region.
+    region_ids is an integer array with the same size as vals, whose values are the
+    region (from 1 to region_cnt) of each point. Points where region_ids is 0 are not
+    included in any sum, nor are masked values of vals. If sum_ndim is None, all
+    dimensions are summed over.
+    The result has a leading region dimension, followed by the remaining dimensions of
+    region_ids.
+    """
+    region_ids = np.asarray(region_ids)
+    if sum_ndim is None:
+        sum_ndim = region_ids.ndim
+    kept_shape = region_ids.shape[: region_ids.ndim - sum_ndim]
+    kept_size = int(np.prod(kept_shape))
+    # bin index of each point is based on its region and position in kept dimensions
+    bin_ids = region_ids.reshape((kept_size, -1)) * kept_size
+    bin_ids += np.arange(kept_size).reshape((kept_size, 1))
+    res = np.bincount(
+        bin_ids.reshape(-1),
+        weights=np.ma.filled(vals, 0.0).reshape(-1),
+        minlength=(region_cnt + 1) * kept_size,
+    )
+    # drop bins of points that are not in any region
+    return res.reshape((region_cnt + 1,) + kept_shape)[1:]
+
+
 ################################################################################
 # utilities related to generic file/path manipulations
 
@@ -241,6 +272,29 @@ def extract_dimensions(fptr, names):
     return res
 
 
+def read_vars_stacked(fptr, varnames):
+    """
+    Return values of vars in varnames, stacked along a new leading axis, and the
+    dimension names and lengths that the vars are defined on.
+    Raise a ValueError if the vars are not all defined on the same dimensions.
+    """
+    dimnames = fptr.variables[varnames[0]].dimensions
+    for varname in varnames[1:]:
+        if fptr.variables[varname].dimensions != dimnames:
+            msg = "not all vars have same dimensions, varnames=%s, fname=%s" % (
+                varnames,
+                fptr.filepath(),
+            )
+            raise ValueError(msg)
+    dimensions = extract_dimensions(fptr, dimnames)
+    vals = np.empty((len(varnames),) + tuple(dimensions.values()))
+    for ind, varname in enumerate(varnames):
+        var = fptr.variables[varname]
+        var.set_auto_mask(False)
+        vals[ind, :] = var[:]
+    return vals, dimensions
+
+
 def create_dimensions_verify(fptr, dimensions):
     """
     Create dimensions in a netCDF4 file. If a dimension with dimname already exists,
@@ -273,6 +327,52 @@ def datatype_sname(var):
     return datatype
 
 
+# format and variable storage options of netCDF files written by the solver
+_netcdf_opts = {
+    "format": "NETCDF3_64BIT_OFFSET",
+    "zlib": False,
+    "complevel": 1,
+    "shuffle": True,
+    "chunk_horizontal": False,
+}
+
+
+def set_netcdf_opts(solverinfo):
+    """
+    set format and variable storage options of netCDF files written by the solver
+    storage options only affect files in a netCDF4 format
+    """
+    _netcdf_opts["format"] = solverinfo.get("netcdf_format", "NETCDF3_64BIT_OFFSET")
+    _netcdf_opts["zlib"] = solverinfo.getboolean("netcdf_zlib", fallback=False)
+    _netcdf_opts["complevel"] = solverinfo.getint("netcdf_complevel", fallback=1)
+    _netcdf_opts["shuffle"] = solverinfo.getboolean("netcdf_shuffle", fallback=True)
+    _netcdf_opts["chunk_horizontal"] = solverinfo.getboolean(
+        "netcdf_chunk_horizontal", fallback=False
+    )
+
+
+def netcdf_format():
+    """return format of netCDF files written by the solver"""
+    return _netcdf_opts["format"]
+
+
+def _netcdf_storage_opts(fptr, dimensions):
+    """return createVariable storage arguments for a variable with dimensions"""
+    if not fptr.data_model.startswith("NETCDF4"):
+        return {}
+    res = {}
+    if _netcdf_opts["zlib"]:
+        res["zlib"] = True
+        res["complevel"] = _netcdf_opts["complevel"]
+        res["shuffle"] = _netcdf_opts["shuffle"]
+    # chunk by horizontal slab, i.e., chunk length 1 except in last 2 dimensions
+    if _netcdf_opts["chunk_horizontal"] and len(dimensions) > 2:
+        res["chunksizes"] = [1] * (len(dimensions) - 2) + [
+            max(1, len(fptr.dimensions[dimname])) for dimname in dimensions[-2:]
+        ]
+    return res
+
+
 def create_vars(fptr, vars_metadata):
     """Create multiple netCDF4 variables, using metadata from vars_metadata."""
     for varname, metadata in vars_metadata.items():
@@ -280,7 +380,11 @@ def create_vars(fptr, vars_metadata):
         attrs = metadata.get("attrs", {})
         fill_value = attrs.get("_FillValue", None)
         var = fptr.createVariable(
-            varname, datatype, metadata["dimensions"], fill_value=fill_value
+            varname,
+            datatype,
+            metadata["dimensions"],
+            fill_value=fill_value,
+            **_netcdf_storage_opts(fptr, metadata["dimensions"]),
         )
         for attr_name, attr_value in attrs.items():
             if attr_name != "_FillValue":
@@ -0,0 +1,30 @@
+"""pytest fixtures shared by test modules"""
+
+import os
+
+import pytest
+
+from src.model_config import ModelConfig
+from src.share import common_args, read_cfg_file
+
+
+def _model_config_obj():
+    """return ModelConfig object for test_problem, with travis_short_workdir workdir"""
+    workdir = os.path.join(os.getenv("HOME"), "travis_short_workdir")
+    args_list = ["--workdir", workdir]
+    parser, args_remaining = common_args("tests", "test_problem", args_list)
+    args = parser.parse_args(args_remaining)
+    config = read_cfg_file(args)
+    return ModelConfig(config["modelinfo"])
+
+
+@pytest.fixture(name="model_config_obj")
+def fixture_model_config_obj():
+    """ModelConfig object for test_problem, with the travis_short_workdir workdir"""
+    return _model_config_obj()
+
+
+@pytest.fixture(name="model_config_obj_module", scope="module")
+def fixture_model_config_obj_module():
+    """ModelConfig object like model_config_obj, for fixtures with module scope"""
+    return _model_config_obj()
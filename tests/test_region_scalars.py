@@ -6,7 +6,12 @@ import numpy as np
 import pytest
 
 from src.model_config import ModelConfig
-from src.region_scalars import RegionScalars, to_ndarray, to_region_scalar_ndarray
+from src.region_scalars import (
+    RegionScalars,
+    RegionScalarsArray,
+    to_ndarray,
+    to_region_scalar_ndarray,
+)
 from src.share import common_args, read_cfg_file
 
 
@@ -41,10 +46,57 @@ def test_to_region_scalar_ndarray(ndim):
     ModelConfig(config["modelinfo"])
 
     expected_shape = tuple(range(3, 3 + ndim))
-    expected = np.full(expected_shape, RegionScalars(1.0))
     arg_in_shape = expected_shape + (1,)
     arg_in = np.full(arg_in_shape, [1.0])
+    expected = RegionScalarsArray(np.full(arg_in_shape, [1.0]))
 
     result = to_region_scalar_ndarray(arg_in)
-    assert result.shape == expected.shape
+    assert result.shape == expected_shape
+    assert result == expected
+
+    # confirm that round trip conversion does not copy
+    assert to_ndarray(result) is arg_in
+
+
+def test_region_scalars_array():
+    """test RegionScalarsArray indexing and arithmetic"""
+    workdir = os.path.join(os.getenv("HOME"), "travis_short_workdir")
+    args_list = ["--workdir", workdir]
+    parser, args_remaining = common_args("test_model_config", "test_problem", args_list)
+    args = parser.parse_args(args_remaining)
+    config = read_cfg_file(args)
+    ModelConfig(config["modelinfo"])
+
+    vals = np.arange(1.0, 7.0).reshape((2, 3, 1))
+    region_scalars_array = RegionScalarsArray(vals)
+    assert region_scalars_array.shape == (2, 3)
+    assert region_scalars_array[1, 2] == RegionScalars([6.0])
+    assert region_scalars_array[:, 1] == RegionScalarsArray([[2.0], [5.0]])
+
+    region_scalars_array[:, 0] = RegionScalarsArray([[-1.0], [-2.0]])
+    assert np.all(vals[:, 0, 0] == [-1.0, -2.0])
+
+    assert (2.0 * region_scalars_array).vals()[1, 1, 0] == 10.0
+    assert (region_scalars_array / region_scalars_array).vals()[0, 2, 0] == 1.0
+    recip_vals = (1.0 / region_scalars_array).vals()
+    assert np.all(recip_vals == region_scalars_array.recip().vals())
+    assert region_scalars_array.sqrt().vals()[1, 2, 0] == np.sqrt(6.0)
+
+
+def test_scale_grid_vals():
+    """confirm that scale_grid_vals agrees with multiplying by broadcast"""
+    workdir = os.path.join(os.getenv("HOME"), "travis_short_workdir")
+    args_list = ["--workdir", workdir]
+    parser, args_remaining = common_args("test_model_config", "test_problem", args_list)
+    args = parser.parse_args(args_remaining)
+    config = read_cfg_file(args)
+    model_config_obj = ModelConfig(config["modelinfo"])
+
+    region_scalars = RegionScalars([2.0])
+    vals = np.arange(2 * model_config_obj.region_mask.size, dtype=np.float64)
+    vals = vals.reshape((2,) + model_config_obj.region_mask.shape)
+    expected = vals * region_scalars.broadcast(model_config_obj.region_mask)
+
+    result = region_scalars.scale_grid_vals(vals)
+    assert result is vals
     assert np.all(result == expected)
@@ -0,0 +1,40 @@
+"""test functions in stats_file.py"""
+
+import os
+
+import numpy as np
+import pytest
+from netCDF4 import Dataset
+
+from src.solver_state import SolverState
+from src.stats_file import StatsFile
+
+
+@pytest.mark.usefixtures("model_config_obj")
+def test_stats_file_flush(tmp_path):
+    """confirm that stats are written, and deferred steps logged, by flush"""
+    solver_state = SolverState("test", tmp_path)
+    stats_file = StatsFile("test", tmp_path, solver_state)
+    fname = os.path.join(tmp_path, "test_stats.nc")
+
+    vars_metadata = {
+        varname: {"dimensions": ("iteration", "region")} for varname in ["a", "b"]
+    }
+    stats_file.def_vars(vars_metadata)
+    stats_file.put_vars(0, {"a": 1.0})
+    solver_state.defer_log_step("put a")
+    assert solver_state.step_logged("put a")
+
+    # nothing is written until flush is called
+    with Dataset(fname, mode="r") as fptr:
+        assert "a" not in fptr.variables
+    solver_state_reread = SolverState("test", tmp_path, resume=True)
+    assert not solver_state_reread.step_logged("put a")
+
+    stats_file.flush()
+    with Dataset(fname, mode="r") as fptr:
+        assert len(fptr.variables["iteration"]) == 1
+        assert np.all(fptr.variables["a"][0, :] == 1.0)
+        assert np.all(fptr.variables["b"][0, :].mask)
+    solver_state_reread = SolverState("test", tmp_path, resume=True)
+    assert solver_state_reread.step_logged("put a")
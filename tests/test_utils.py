@@ -1,8 +1,21 @@
-"""test functions in spatial_axis.py"""
+"""test functions in utils.py"""
 
+import configparser
+import os
+
+import numpy as np
 import pytest
+from netCDF4 import Dataset
 
-from src.utils import units_str_format
+from src.utils import (
+    create_dimensions_verify,
+    create_vars,
+    netcdf_format,
+    read_vars_stacked,
+    region_sum,
+    set_netcdf_opts,
+    units_str_format,
+)
 
 
 @pytest.mark.parametrize(
@@ -28,3 +41,60 @@ from src.utils import units_str_format
 def test_units_str_format(units_str, expected):
     """test units_str_format"""
     assert units_str_format(units_str) == expected
+
+
+def test_region_sum():
+    """test region_sum"""
+    region_ids = np.array([[1, 0, 2], [2, 2, 1]])
+    vals = np.array([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]])
+    assert np.all(region_sum(vals, region_ids, 2) == [7.0, 12.0])
+    expected = [[1.0, 6.0], [3.0, 9.0]]
+    assert np.all(region_sum(vals, region_ids, 2, sum_ndim=1) == expected)
+    vals_masked = np.ma.masked_array(vals, mask=[[0, 0, 1], [0, 0, 0]])
+    assert np.all(region_sum(vals_masked, region_ids, 2) == [7.0, 9.0])
+
+
+def test_set_netcdf_opts(tmp_path, monkeypatch):
+    """test that netCDF options are applied to created variables"""
+    monkeypatch.setattr("src.utils._netcdf_opts", {})
+    config = configparser.ConfigParser()
+    config["solverinfo"] = {
+        "netcdf_format": "NETCDF4",
+        "netcdf_zlib": "True",
+        "netcdf_complevel": "4",
+        "netcdf_chunk_horizontal": "True",
+    }
+    set_netcdf_opts(config["solverinfo"])
+    assert netcdf_format() == "NETCDF4"
+
+    fname = tmp_path / "test_set_netcdf_opts.nc"
+    with Dataset(fname, mode="w", format=netcdf_format()) as fptr:
+        create_dimensions_verify(fptr, {"z": 3, "y": 4, "x": 5})
+        create_vars(fptr, {"var": {"dimensions": ("z", "y", "x")}})
+        filters = fptr.variables["var"].filters()
+        assert filters["zlib"] and filters["complevel"] == 4 and filters["shuffle"]
+        assert fptr.variables["var"].chunking() == [1, 4, 5]
+
+
+def test_read_vars_stacked(tmp_path):
+    """test read_vars_stacked"""
+    fname = os.path.join(tmp_path, "vars.nc")
+    vals_in = np.arange(24.0).reshape((2, 3, 4))
+    with Dataset(fname, mode="w") as fptr:
+        create_dimensions_verify(fptr, {"y": 3, "x": 4, "z": 4})
+        create_vars(
+            fptr,
+            {
+                "a": {"dimensions": ("y", "x")},
+                "b": {"dimensions": ("y", "x")},
+                "c": {"dimensions": ("y", "z")},
+            },
+        )
+        fptr.variables["a"][:] = vals_in[0, :]
+        fptr.variables["b"][:] = vals_in[1, :]
+    with Dataset(fname, mode="r") as fptr:
+        vals, dimensions = read_vars_stacked(fptr, ["a", "b"])
+        assert np.array_equal(vals, vals_in)
+        assert dimensions == {"y": 3, "x": 4}
+        with pytest.raises(ValueError):
+            read_vars_stacked(fptr, ["a", "c"])
@@ -0,0 +1,42 @@
+"""test functions in vert_mix.py"""
+
+import numpy as np
+
+from src.test_problem.spatial_axis import SpatialAxis, spatial_axis_defn_dict
+from src.test_problem.vert_mix import VertMix
+
+
+def test_mixing_coeff_times():
+    """confirm that mixing_coeff_times reproduces mixing_coeff exactly"""
+    depth = SpatialAxis(defn_dict=spatial_axis_defn_dict())
+    vert_mix = VertMix(depth)
+    times = np.linspace(0.0, 365.0, 101)
+    expected = np.stack([vert_mix.mixing_coeff(time).copy() for time in times])
+    assert np.array_equal(vert_mix.mixing_coeff_times(times), expected)
+
+
+def test_tend_block():
+    """confirm that tend of a (tracer, depth) block reproduces single tracer tend"""
+    depth = SpatialAxis(defn_dict=spatial_axis_defn_dict())
+    vert_mix = VertMix(depth)
+    time = 100.0
+    tracer_vals = np.random.default_rng(0).random((3, len(depth)))
+    surf_flux = np.array([0.0, 1.0, -2.0])
+    tend = vert_mix.tend(time, tracer_vals, surf_flux)
+    for ind in range(tracer_vals.shape[0]):
+        expected = vert_mix.tend(time, tracer_vals[ind, :], surf_flux[ind])
+        assert np.array_equal(tend[ind, :], expected)
+
+
+def test_mixing_coeff_cache():
+    """confirm that mixing_coeff reuses vals for recent times"""
+    depth = SpatialAxis(defn_dict=spatial_axis_defn_dict())
+    vert_mix = VertMix(depth)
+    stage_times = [10.0, 10.2, 10.5]
+    vals = [vert_mix.mixing_coeff(time) for time in stage_times]
+    for time, vals_time in zip(stage_times, vals):
+        assert vert_mix.mixing_coeff(time) is vals_time
+    for time in np.linspace(20.0, 30.0, 100):
+        vert_mix.mixing_coeff(time)
+    assert vert_mix.mixing_coeff(stage_times[0]) is not vals[0]
+    assert np.array_equal(vert_mix.mixing_coeff(stage_times[0]), vals[0])